@@ -120,4 +120,61 @@ class BotSettings(DataBaseHandle):
         super().__del__()
 
 
-set_db = BotSettings()
\ No newline at end of file
+class TelegramFiles(DataBaseHandle):
+    """
+    Telegram file_id of media already sent by the bot
+    (file_ids are only valid for the bot that uploaded them)
+    """
+    def __init__(self, dburl=None):
+        if dburl is None:
+            dburl = Config.DATABASE_URL
+        super().__init__(dburl)
+
+        files_schema = """CREATE TABLE IF NOT EXISTS telegram_files (
+            provider VARCHAR(20) NOT NULL,
+            item_id VARCHAR(100) NOT NULL,
+            quality VARCHAR(100) NOT NULL,
+            kind VARCHAR(20) NOT NULL,
+            bot_id VARCHAR(20) NOT NULL,
+            file_ids TEXT NOT NULL,
+            date_changed TIMESTAMP NOT NULL,
+            PRIMARY KEY (provider, item_id, quality, kind, bot_id)
+        )"""
+
+        cur = self.scur()
+        cur.execute(files_schema)
+        self._conn.commit()
+        self.ccur(cur)
+
+    def get_file_ids(self, provider, item_id, quality, kind, bot_id):
+        sql = "SELECT file_ids FROM telegram_files WHERE provider=%s AND item_id=%s AND quality=%s AND kind=%s AND bot_id=%s"
+        cur = self.scur()
+
+        cur.execute(sql, (provider, item_id, quality, kind, bot_id))
+        row = cur.fetchone()
+        self.ccur(cur)
+        return row[0].split(',') if row else None
+
+    def set_file_ids(self, provider, item_id, quality, kind, bot_id, file_ids):
+        sql = """INSERT INTO telegram_files(provider,item_id,quality,kind,bot_id,file_ids,date_changed)
+            VALUES(%s,%s,%s,%s,%s,%s,%s)
+            ON CONFLICT (provider, item_id, quality, kind, bot_id)
+            DO UPDATE SET file_ids=EXCLUDED.file_ids, date_changed=EXCLUDED.date_changed"""
+        cur = self.scur()
+
+        cur.execute(sql, (provider, item_id, quality, kind, bot_id, ','.join(file_ids), datetime.datetime.now()))
+        self.ccur(cur)
+
+    def delete_file_ids(self, provider, item_id, quality, kind, bot_id):
+        sql = "DELETE FROM telegram_files WHERE provider=%s AND item_id=%s AND quality=%s AND kind=%s AND bot_id=%s"
+        cur = self.scur()
+
+        cur.execute(sql, (provider, item_id, quality, kind, bot_id))
+        self.ccur(cur)
+
+    def __del__(self):
+        super().__del__()
+
+
+set_db = BotSettings()
+file_db = TelegramFiles()
\ No newline at end of file
@@ -1,4 +1,3 @@
-import aiohttp
 import aiolimiter
 
 from random import randint
@@ -10,6 +9,7 @@ from requests.models import HTTPError
 
 from config import Config
 from bot.logger import LOGGER
+from bot.helpers.http_pool import http_pool
 
 class APIError(Exception):
     def __init__(self, type, msg, payload):
@@ -63,7 +63,7 @@ class DeezerAPI:
 
 
     async def login(self):
-        self.session = aiohttp.ClientSession()
+        self.session = http_pool.client_session()
         self.session.headers.update({
             'accept': '*/*',
             'user-agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36',
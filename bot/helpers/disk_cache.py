@@ -0,0 +1,278 @@
+import os
+import json
+import fcntl
+import shutil
+import asyncio
+import uuid
+import hashlib
+
+from PIL import Image
+from collections import OrderedDict
+from typing import Optional
+
+from config import Config
+from bot.logger import LOGGER
+
+from .downloader import fetch_file
+
+
+FICLONE = 0x40049409  # linux ioctl for reflink copies (btrfs, xfs)
+
+
+def link_file(src, dst):
+    """
+    Make dst point to the same data as src without copying if possible
+    hardlink -> reflink -> plain copy
+    The link/copy is made under a temp name and renamed over dst, an
+    existing dst (maybe a hardlink of src) is never opened for writing.
+    """
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp = f"{dst}.{uuid.uuid4().hex}.tmp"
+    try:
+        try:
+            os.link(src, tmp)
+        except OSError:
+            try:
+                with open(src, 'rb') as s, open(tmp, 'wb') as d:
+                    fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            except OSError:
+                shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def make_thumbnail(src, dst, size:int):
+    """Scaled down JPEG copy of an image (fits in size x size)"""
+    with Image.open(src) as image:
+        image = image.convert('RGB')
+        image.thumbnail((size, size))
+        image.save(dst, 'JPEG', quality=85)
+
+
+def file_digest(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    Size bounded LRU store of files with a persistent JSON index.
+    Blobs are content addressed (sha256), so identical files stored
+    under different keys share the same data on disk.
+    """
+    def __init__(self, folder: str, max_size: int):
+        self.folder = folder
+        self.max_size = max_size
+        self.index_path = os.path.join(folder, 'index.json')
+        self._entries: Optional[OrderedDict] = None  # key -> entry (LRU order)
+        self._blobs = {}  # blob -> {'size', 'refs'}
+        self._lock = asyncio.Lock()
+
+    @property
+    def entries(self) -> OrderedDict:
+        if self._entries is None:
+            self._load()
+        return self._entries
+
+    def _load(self):
+        self._entries = OrderedDict()
+        try:
+            with open(self.index_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = []
+        for key, entry in data:
+            if os.path.exists(self._blob_path(entry['blob'])):
+                self._add(key, entry)
+
+    def _save(self):
+        os.makedirs(self.folder, exist_ok=True)
+        temp = f"{self.index_path}.tmp"
+        with open(temp, 'w') as f:
+            json.dump(list(self.entries.items()), f)
+        os.replace(temp, self.index_path)
+
+    def _blob_path(self, blob) -> str:
+        return os.path.join(self.folder, blob[:2], blob)
+
+    def _add(self, key, entry):
+        self._entries[key] = entry
+        blob = self._blobs.setdefault(entry['blob'], {'size': entry['size'], 'refs': 0})
+        blob['refs'] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        blob = self._blobs[entry['blob']]
+        blob['refs'] -= 1
+        if blob['refs'] <= 0:
+            del self._blobs[entry['blob']]
+            try:
+                os.remove(self._blob_path(entry['blob']))
+            except FileNotFoundError:
+                pass
+
+    @property
+    def size(self) -> int:
+        return sum(blob['size'] for blob in self._blobs.values())
+
+    def _evict(self):
+        while self.entries and self.size > self.max_size:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+
+    def get(self, key) -> Optional[dict]:
+        """
+        Returns:
+            entry dict with 'path' of the cached file, None if not cached
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        path = self._blob_path(entry['blob'])
+        if not os.path.exists(path):
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return dict(entry, path=path)
+
+    async def put(self, key, src, **extra) -> Optional[dict]:
+        """
+        Add a file to the cache (src is left untouched)
+        Args:
+            key: cache key
+            src: path of the file
+            extra: additional info saved in the index entry
+        """
+        try:
+            digest = await asyncio.to_thread(file_digest, src)
+            ext = os.path.splitext(src)[1]
+            blob = f"{digest}{ext}"
+            async with self._lock:
+                path = self._blob_path(blob)
+                if not os.path.exists(path):
+                    await asyncio.to_thread(link_file, src, path)
+                if key in self.entries:
+                    self._remove(key)
+                self._add(key, dict(extra, blob=blob, size=os.path.getsize(path)))
+                self._evict()
+                self._save()
+            return self.get(key)
+        except Exception as e:
+            LOGGER.error(f"CACHE : Failed to store {key} - {e}")
+            return None
+
+    async def fetch(self, entry: dict, dst):
+        """Place a cached file at dst (hardlink/reflink when possible)"""
+        await asyncio.to_thread(link_file, entry['path'], dst)
+
+
+class TrackCache(DiskCache):
+    """
+    Tagged audio files shared across users and requests
+    keyed by (provider, track id, quality)
+    """
+    def __init__(self):
+        self.settings = Config.TRACK_CACHE
+        super().__init__(self.settings['PATH'], self.settings['MAX_SIZE'])
+
+    @staticmethod
+    def key(provider, track_id, *quality) -> str:
+        return ':'.join(str(i) for i in (provider.lower(), track_id, *quality))
+
+    def get(self, key) -> Optional[dict]:
+        if not self.settings['ENABLED']:
+            return None
+        return super().get(key)
+
+    async def put(self, key, src, **extra) -> Optional[dict]:
+        if not self.settings['ENABLED']:
+            return None
+        return await super().put(key, src, **extra)
+
+
+class CoverCache(DiskCache):
+    """
+    Cover art shared across users and requests
+    keyed by (provider, image id). Only the full size image is fetched,
+    the thumbnail is made from it locally. Concurrent requests for the same
+    image wait for the first one instead of fetching it again.
+    """
+    def __init__(self):
+        self.settings = Config.COVER_CACHE
+        super().__init__(self.settings['PATH'], self.settings['MAX_SIZE'])
+        self._pending = {}  # key -> task of the fetch in progress
+
+    @staticmethod
+    def key(provider, image_id) -> str:
+        return f"{provider.lower()}:{image_id}"
+
+    async def covers(self, key, url, cover, thumbnail) -> bool:
+        """
+        Place the cover and its thumbnail at the given paths
+        Args:
+            key: cache key (see key())
+            url: full size image url
+            cover: path for the cover
+            thumbnail: path for the thumbnail
+        Returns:
+            False if the image could not be fetched
+        """
+        if not self.settings['ENABLED']:
+            return await self._download(url, cover, thumbnail)
+
+        entries = self.get(f"{key}:cover"), self.get(f"{key}:thumb")
+        if None in entries:
+            task = self._pending.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self._store(key, url))
+                self._pending[key] = task
+                task.add_done_callback(lambda _: self._pending.pop(key, None))
+            entries = await asyncio.shield(task)
+            if entries is None:
+                return False
+        try:
+            await self.fetch(entries[0], cover)
+            await self.fetch(entries[1], thumbnail)
+            return True
+        except OSError:
+            # evicted in between
+            return await self._download(url, cover, thumbnail)
+
+    async def _download(self, url, cover, thumbnail) -> bool:
+        try:
+            os.makedirs(os.path.dirname(cover), exist_ok=True)
+            await fetch_file(url, cover, 5)
+            await asyncio.to_thread(make_thumbnail, cover, thumbnail, self.settings['THUMB_SIZE'])
+            return True
+        except Exception as e:
+            LOGGER.debug(f"CACHE : Failed to get cover {url} - {e}")
+            return False
+
+    async def _store(self, key, url):
+        temp = os.path.join(self.folder, 'temp', uuid.uuid4().hex)
+        cover, thumbnail = f"{temp}.jpg", f"{temp}-thumb.jpg"
+        try:
+            if not await self._download(url, cover, thumbnail):
+                return None
+            entries = await self.put(f"{key}:cover", cover), await self.put(f"{key}:thumb", thumbnail)
+            return None if None in entries else entries
+        finally:
+            for path in (cover, thumbnail):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+track_cache = TrackCache()
+cover_cache = CoverCache()
@@ -0,0 +1,210 @@
+import time
+import heapq
+import asyncio
+import itertools
+
+from pyrogram.errors import FloodWait
+
+from config import Config
+from bot.logger import LOGGER
+
+
+# priorities, lower goes first
+RESULT = 0 # files, links, errors
+STATUS = 1 # status edits (uploading, zipping...)
+PROGRESS = 2 # progress edits, dropped while the chat is flooded
+
+IDLE_CHATS = 1024 # idle chats kept before their state is pruned
+
+
+class TokenBucket:
+    """
+    Args:
+        rate: tokens added per second
+        capacity: max tokens saved up (burst)
+    """
+    def __init__(self, rate:float, capacity:float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+
+    def delay(self) -> float:
+        """Seconds until a token is available (0 if there is one)"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class _Op:
+    __slots__ = ('call', 'priority', 'key', 'future', 'taken')
+
+    def __init__(self, call, priority, key):
+        self.call = call
+        self.priority = priority
+        self.key = key
+        self.future = asyncio.get_running_loop().create_future()
+        self.taken = False
+
+
+class _Chat:
+    def __init__(self, rate:float, burst:int):
+        self.bucket = TokenBucket(rate, burst)
+        self.queue = [] # heap of (priority, seq, op)
+        self.edits = {} # merge key -> queued op
+        self.until = 0 # end of the last FloodWait (monotonic)
+        self.worker = None
+
+    def idle(self) -> bool:
+        return self.worker is None and not self.queue and self.until < time.monotonic()
+
+
+class Dispatcher:
+    """
+    Single outbound path for messages and edits sent to chats.
+    Every chat has a token bucket modelling Telegram's per chat limit and all
+    chats share a global one, so concurrent jobs queue up instead of hitting
+    FloodWait. Queued calls go out by priority (results before status and
+    progress edits); a queued edit of a message is replaced by a newer edit
+    of the same message. A FloodWait pauses only its chat, the call is
+    queued again and pending progress edits are dropped.
+    """
+    def __init__(self):
+        self.chats = {}
+        self._bucket = None
+        self._seq = itertools.count()
+        self._tasks = set()
+
+    @property
+    def bucket(self) -> TokenBucket:
+        if self._bucket is None:
+            rate = Config.PERFORMANCE['OUTBOUND']['GLOBAL_RATE']
+            self._bucket = TokenBucket(rate, rate)
+        return self._bucket
+
+    def _chat(self, chat_id) -> _Chat:
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            if len(self.chats) >= IDLE_CHATS:
+                for cid in [cid for cid, c in self.chats.items() if c.idle()]:
+                    del self.chats[cid]
+            settings = Config.PERFORMANCE['OUTBOUND']
+            group = isinstance(chat_id, int) and chat_id < 0
+            chat = _Chat(settings['GROUP_RATE'] if group else settings['CHAT_RATE'], settings['BURST'])
+            self.chats[chat_id] = chat
+        return chat
+
+    async def submit(self, chat_id, call, priority=RESULT, key=None):
+        """
+        Queue a call sending to a chat and wait for its result
+        Args:
+            chat_id: chat the call sends to
+            call: coroutine function doing the request (called again after a FloodWait)
+            priority: RESULT | STATUS | PROGRESS
+            key: merge key, a queued call with the same key is replaced by this one
+        Returns:
+            result of call (None for a dropped or replaced progress edit)
+        """
+        chat = self._chat(chat_id)
+        if priority == PROGRESS and chat.until > time.monotonic():
+            return None
+
+        op = chat.edits.get(key) if key is not None else None
+        if op is not None:
+            # newest text wins, every caller gets the result of the one edit
+            op.call = call
+            if priority < op.priority:
+                op.priority = priority
+                heapq.heappush(chat.queue, (priority, next(self._seq), op))
+        else:
+            op = _Op(call, priority, key)
+            self._push(chat, op)
+        self._wake(chat_id, chat)
+        return await asyncio.shield(op.future)
+
+    def _push(self, chat:_Chat, op:_Op):
+        op.taken = False
+        if op.key is not None:
+            chat.edits[op.key] = op
+        heapq.heappush(chat.queue, (op.priority, next(self._seq), op))
+
+    def _pop(self, chat:_Chat) -> _Op | None:
+        while chat.queue:
+            op = heapq.heappop(chat.queue)[2]
+            if op.taken or op.future.done():
+                continue
+            op.taken = True
+            if op.key is not None and chat.edits.get(op.key) is op:
+                del chat.edits[op.key]
+            return op
+        return None
+
+    def _wake(self, chat_id, chat:_Chat):
+        if chat.worker is None:
+            chat.worker = asyncio.create_task(self._worker(chat_id, chat))
+
+    async def _worker(self, chat_id, chat:_Chat):
+        try:
+            while chat.queue:
+                wait = max(chat.bucket.delay(), self.bucket.delay(), chat.until - time.monotonic())
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                op = self._pop(chat)
+                if op is None:
+                    break
+                chat.bucket.take()
+                self.bucket.take()
+                # run detached so a long upload does not hold the chat queue
+                task = asyncio.create_task(self._run(chat_id, chat, op))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        finally:
+            chat.worker = None
+
+    async def _run(self, chat_id, chat:_Chat, op:_Op):
+        try:
+            result = await op.call()
+        except FloodWait as e:
+            LOGGER.info(f"DISPATCH : FloodWait of {e.value}s in {chat_id}")
+            chat.until = max(chat.until, time.monotonic() + e.value)
+            self._drop_progress(chat)
+            if op.priority == PROGRESS or (op.key is not None and op.key in chat.edits):
+                # progress is stale after the wait / a newer edit is queued
+                op.future.set_result(None)
+            else:
+                self._push(chat, op)
+                self._wake(chat_id, chat)
+            return
+        except asyncio.CancelledError:
+            op.future.cancel()
+            raise
+        except Exception as e:
+            if not op.future.done():
+                op.future.set_exception(e)
+            return
+        if not op.future.done():
+            op.future.set_result(result)
+
+    def _drop_progress(self, chat:_Chat):
+        kept = []
+        for entry in chat.queue:
+            op = entry[2]
+            if op.priority == PROGRESS and not op.taken:
+                op.taken = True
+                if op.key is not None and chat.edits.get(op.key) is op:
+                    del chat.edits[op.key]
+                op.future.set_result(None)
+            else:
+                kept.append(entry)
+        heapq.heapify(kept)
+        chat.queue = kept
+
+
+dispatcher = Dispatcher()
@@ -0,0 +1,385 @@
+import os
+import json
+import asyncio
+
+from aiohttp import ClientTimeout
+
+from config import Config
+from bot.logger import LOGGER
+
+from .error import DownloadError
+from .http_pool import http_pool
+
+
+SEGMENT_SETTINGS = Config.PERFORMANCE['SEGMENTED_DOWNLOAD']
+CHUNK_SIZE = Config.PERFORMANCE['CHUNK_SIZE']
+# sidecar is rewritten after this many new bytes (and on every failure)
+SIDECAR_SAVE_INTERVAL = 8 * 1024 * 1024
+# a FLAC metadata block length is 24 bits
+MAX_RESERVE = (1 << 24) - 1 + 4
+
+
+def _timeout(timeout):
+    # inactivity timeout - a total timeout would kill large files on slow links
+    return ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+
+
+def split_ranges(size:int, segments:int) -> list:
+    """
+    Args:
+        size: total size of the file in bytes
+        segments: number of byte ranges wanted
+    Returns:
+        list of [start, end] (inclusive) byte ranges
+    """
+    segments = max(1, min(segments, size))
+    step = size // segments
+    ranges = []
+    for i in range(segments):
+        start = i * step
+        end = size - 1 if i == segments - 1 else start + step - 1
+        ranges.append([start, end])
+    return ranges
+
+
+def preallocate(path, size):
+    """Create the output file with its final size so ranges can be written at their offsets"""
+    with open(path, 'wb') as f:
+        if size and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+                return
+            except OSError:
+                pass
+        f.truncate(size or 0)
+
+
+class PartFile:
+    """
+    Download in progress: `<path>.part` plus a `<path>.part.json` sidecar.
+    The sidecar holds the validators of the remote file (ETag, Last-Modified, size)
+    and the remaining byte ranges. A range start is only moved forward after its
+    bytes were written, so everything before it is validated data.
+    Args:
+        path: final file path
+        reserve: bytes kept free in front of the data (FLAC tag padding)
+    """
+    def __init__(self, path, reserve=0):
+        self.path = path
+        self.reserve = min(reserve, MAX_RESERVE)
+        self.part = f"{path}.part"
+        self.sidecar = f"{self.part}.json"
+        self.size = None
+        self.etag = None
+        self.last_modified = None
+        self.ranges = []
+        self.starts = []
+        self._unsaved = 0
+
+    @classmethod
+    def load(cls, path):
+        """
+        Returns:
+            PartFile if a resumable part exists for path, else None
+        """
+        state = cls(path)
+        try:
+            with open(state.sidecar) as f:
+                data = json.load(f)
+            if not os.path.exists(state.part):
+                raise FileNotFoundError(state.part)
+        except (OSError, ValueError):
+            state.discard()
+            return None
+        state.size = data.get('size')
+        state.etag = data.get('etag')
+        state.last_modified = data.get('last_modified')
+        state.ranges = data.get('ranges', [])
+        state.starts = data.get('starts', [])
+        state.reserve = data.get('reserve', 0)
+        return state
+
+    def create(self, size, headers, ranges):
+        """Start a fresh part file"""
+        self.size = size
+        self.etag = headers.get('ETag')
+        self.last_modified = headers.get('Last-Modified')
+        self.ranges = ranges
+        self.starts = [r[0] for r in ranges]
+        preallocate(self.part, size + self.reserve if size else self.reserve)
+        self.save()
+
+    @property
+    def done(self) -> int:
+        """Validated bytes"""
+        return sum(r[0] - start for r, start in zip(self.ranges, self.starts))
+
+    @property
+    def complete(self) -> bool:
+        return all(r[1] is not None and r[0] > r[1] for r in self.ranges)
+
+    def matches(self, headers, size=None) -> bool:
+        """
+        Check that a response belongs to the same file version as the part
+        Args:
+            headers: response headers
+            size: total size reported by the response (if known)
+        """
+        checked = False
+        etag = headers.get('ETag')
+        if self.etag and etag:
+            if etag != self.etag:
+                return False
+            checked = True
+        last_modified = headers.get('Last-Modified')
+        if self.last_modified and last_modified:
+            if last_modified != self.last_modified:
+                return False
+            checked = True
+        if self.size is not None and size is not None:
+            if size != self.size:
+                return False
+            checked = True
+        return checked
+
+    def advance(self, index, length):
+        self.ranges[index][0] += length
+        self._unsaved += length
+        if self._unsaved >= SIDECAR_SAVE_INTERVAL:
+            self.save()
+
+    def save(self):
+        temp = f"{self.sidecar}.tmp"
+        with open(temp, 'w') as f:
+            json.dump({
+                'size': self.size,
+                'etag': self.etag,
+                'last_modified': self.last_modified,
+                'ranges': self.ranges,
+                'starts': self.starts,
+                'reserve': self.reserve
+            }, f)
+        os.replace(temp, self.sidecar)
+        self._unsaved = 0
+
+    def finish(self):
+        """Atomically move the completed part to its final path"""
+        os.replace(self.part, self.path)
+        try:
+            os.remove(self.sidecar)
+        except FileNotFoundError:
+            pass
+
+    def discard(self):
+        for path in (self.part, self.sidecar):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def close_reserve(path, reserve):
+    """
+    Turn the space reserved in front of a downloaded FLAC into a PADDING
+    block after its metadata blocks. Only the metadata is moved, so tags and
+    cover can later be written in place instead of rewriting the whole file.
+    Anything that is not a FLAC stream is moved back to offset 0.
+    """
+    with open(path, 'r+b') as f:
+        f.seek(reserve)
+        if f.read(4) != b'fLaC':
+            return _unshift(f, reserve)
+        length = 4
+        while True:
+            header = f.read(4)
+            if len(header) < 4:
+                return _unshift(f, reserve)
+            last = length
+            length += 4 + int.from_bytes(header[1:], 'big')
+            f.seek(reserve + length)
+            if header[0] & 0x80:
+                break
+
+        f.seek(reserve)
+        head = bytearray(f.read(length))
+        head[last] &= 0x7F  # padding becomes the last metadata block
+        f.seek(0)
+        f.write(head)
+        f.write(bytes([0x81]) + (reserve - 4).to_bytes(3, 'big'))
+        # old copy of the metadata is now inside the padding
+        start = max(length + 4, reserve)
+        f.seek(start)
+        f.write(bytes(reserve + length - start))
+
+
+def _unshift(f, reserve):
+    LOGGER.debug(f"Reserved space not used for {f.name}, moving data back")
+    read_at, write_at = reserve, 0
+    while True:
+        f.seek(read_at)
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        f.seek(write_at)
+        f.write(chunk)
+        read_at += len(chunk)
+        write_at += len(chunk)
+    f.truncate(write_at)
+
+
+def discard_partial(path):
+    """Remove leftover .part/sidecar files of a failed download"""
+    PartFile(path).discard()
+
+
+def _content_range_total(headers):
+    # Content-Range: bytes 0-0/12345
+    total = headers.get('Content-Range', '').rpartition('/')[2]
+    return int(total) if total.isdigit() else None
+
+
+async def probe(url, timeout=30) -> dict:
+    """
+    Check if the server supports byte ranges for the url
+    Args:
+        url: file url
+        timeout: connect/read timeout in seconds
+    Returns:
+        dict: size (int|None), ranges (bool), headers (validators)
+    """
+    async with http_pool.session.get(
+        url,
+        headers={'Range': 'bytes=0-0'},
+        timeout=_timeout(timeout)
+    ) as response:
+        if response.status == 206:
+            size = _content_range_total(response.headers)
+            return {'size': size, 'ranges': size is not None, 'headers': response.headers}
+        elif response.status == 200:
+            accept = response.headers.get('Accept-Ranges', 'none').lower()
+            return {'size': response.content_length, 'ranges': accept == 'bytes', 'headers': response.headers}
+        raise DownloadError(f"HTTP Status: {response.status}")
+
+
+async def _write_response(response, state:PartFile, index, progress=None):
+    offset = state.ranges[index][0] + state.reserve
+    with open(state.part, 'r+b') as f:
+        f.seek(offset)
+        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+            f.write(chunk)
+            # bytes must be on disk before the sidecar can count them
+            f.flush()
+            state.advance(index, len(chunk))
+            if progress:
+                await progress(state.done, state.size)
+
+
+async def fetch_range(url, state:PartFile, index, timeout=30, progress=None):
+    """
+    Downloads the remaining part of a byte range into its offset of the part file
+    Args:
+        state: PartFile of the download
+        index: index of the range in state.ranges
+    """
+    start, end = state.ranges[index]
+    if end is not None and start > end:
+        return
+    headers = {'Range': f"bytes={start}-{'' if end is None else end}"}
+    validator = state.etag or state.last_modified
+    if validator:
+        headers['If-Range'] = validator
+
+    async with http_pool.session.get(url, headers=headers, timeout=_timeout(timeout)) as response:
+        if response.status != 206 or not state.matches(response.headers, _content_range_total(response.headers)):
+            # server ignored the range or the file changed (If-Range failed)
+            raise DownloadError(f"HTTP Status: {response.status} (range {start}-{end} not resumable)")
+        await _write_response(response, state, index, progress)
+
+    if end is None:
+        # unknown size, stream ended at EOF
+        state.ranges[index][1] = state.ranges[index][0] - 1
+    elif state.ranges[index][0] <= end:
+        raise ConnectionError(f"Range {start}-{end} ended early")
+
+
+async def fetch_ranges(url, state:PartFile, timeout=30, progress=None):
+    tasks = [
+        asyncio.create_task(fetch_range(url, state, i, timeout, progress))
+        for i in range(len(state.ranges))
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def fetch_stream(url, state:PartFile, timeout=30, progress=None):
+    """
+    Fresh single connection download into the part file
+    """
+    async with http_pool.session.get(url, timeout=_timeout(timeout)) as response:
+        if response.status != 200:
+            raise DownloadError(f"HTTP Status: {response.status}")
+        size = response.content_length
+        state.create(size, response.headers, [[0, size - 1 if size else None]])
+        await _write_response(response, state, 0, progress)
+    if size is None:
+        state.ranges[0][1] = state.ranges[0][0] - 1
+    elif state.ranges[0][0] < size:
+        raise ConnectionError("Stream ended early")
+
+
+async def fetch_file(url, path, timeout=30, segmented=False, progress=None, max_size=None, reserve=0):
+    """
+    Downloads url to path through `<path>.part`.
+    A part left by a failed attempt is resumed with Range requests if the
+    remote file is unchanged, otherwise the download restarts from zero.
+    The final path only appears (atomic rename) once the file is complete.
+    Args:
+        url: file url
+        path: output file path
+        timeout: connect/read timeout in seconds
+        segmented: allow parallel byte ranges (for big audio files)
+        progress: async callback(done_bytes, total_bytes)
+        max_size: refuse files bigger than this (bytes)
+        reserve: FLAC padding to make room for (see close_reserve)
+    """
+    state = PartFile.load(path)
+    try:
+        if state and state.ranges:
+            LOGGER.debug(f"Resuming {os.path.basename(path)} from {state.done} bytes")
+            try:
+                await fetch_ranges(url, state, timeout, progress)
+            except DownloadError as e:
+                LOGGER.debug(f"Cannot resume {os.path.basename(path)} ({e}), restarting")
+                state.discard()
+                state = None
+
+        if state is None:
+            state = PartFile(path, reserve)
+            info = None
+            if (segmented and SEGMENT_SETTINGS['ENABLED']) or max_size:
+                info = await probe(url, timeout)
+                if max_size and info['size'] and info['size'] > max_size:
+                    raise DownloadError(f"File size exceeds limit: {info['size']} bytes")
+
+            if info and segmented and SEGMENT_SETTINGS['ENABLED'] and info['ranges'] \
+                    and info['size'] and info['size'] >= SEGMENT_SETTINGS['MIN_SIZE']:
+                state.create(info['size'], info['headers'], split_ranges(info['size'], SEGMENT_SETTINGS['SEGMENTS']))
+                await fetch_ranges(url, state, timeout, progress)
+            else:
+                await fetch_stream(url, state, timeout, progress)
+    except BaseException:
+        if state is not None and state.ranges:
+            state.save()
+        raise
+
+    if not state.complete:
+        state.save()
+        raise ConnectionError(f"Incomplete download: {state.done} bytes")
+    if state.reserve:
+        await asyncio.to_thread(close_reserve, state.part, state.reserve)
+    state.finish()
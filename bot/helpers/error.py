@@ -6,6 +6,18 @@ class DownloadError(BotError):
     """Raised when download fails"""
     pass
 
+class RcloneError(BotError):
+    """Raised when an rclone remote control call fails"""
+    pass
+
+class UploadError(BotError):
+    """Raised when a telegram file upload fails"""
+    pass
+
+class ZipStreamError(BotError):
+    """Raised when a streamed zip does not match its planned size"""
+    pass
+
 class RateLimitError(BotError):
     """Raised when rate limit exceeded"""
     pass
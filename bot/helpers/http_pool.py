@@ -0,0 +1,125 @@
+import asyncio
+import aiohttp
+
+from typing import Optional
+
+from config import Config
+from bot.logger import LOGGER
+
+
+class HttpPool:
+    """
+    Process wide connection pool.
+    Every aiohttp session in the bot is created on top of one shared
+    TCPConnector so that connections, TLS sessions and DNS lookups to the
+    same CDN/API hosts are reused across tracks, covers and requests.
+    """
+    def __init__(self):
+        self.settings = Config.PERFORMANCE['HTTP_POOL']
+        self._connector: Optional[aiohttp.TCPConnector] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._stats = {
+            'requests': 0,
+            'new_connections': 0,
+            'reused_connections': 0,
+            'dns_cache_hits': 0,
+            'dns_cache_misses': 0
+        }
+
+    @property
+    def connector(self) -> aiohttp.TCPConnector:
+        """Shared connector (created lazily inside the running loop)"""
+        if self._connector is None or self._connector.closed:
+            self._connector = aiohttp.TCPConnector(
+                limit=self.settings['LIMIT'],
+                limit_per_host=self.settings['LIMIT_PER_HOST'],
+                keepalive_timeout=self.settings['KEEPALIVE_TIMEOUT'],
+                use_dns_cache=True,
+                ttl_dns_cache=self.settings['DNS_CACHE_TTL']
+            )
+        return self._connector
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Plain session for file downloads (no default headers/cookies)"""
+        if self._session is None or self._session.closed:
+            self._session = self.client_session()
+        return self._session
+
+    def client_session(self, **kwargs) -> aiohttp.ClientSession:
+        """
+        New session sharing the pooled connector.
+        API clients get their own session so auth headers and cookies stay
+        separate, while the underlying connections are still pooled.
+        Closing it does not close the shared connector.
+        """
+        kwargs.setdefault('trace_configs', [self._trace_config()])
+        return aiohttp.ClientSession(
+            connector=self.connector,
+            connector_owner=False,
+            **kwargs
+        )
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        def counter(key):
+            async def _count(session, ctx, params):
+                self._stats[key] += 1
+            return _count
+
+        trace.on_request_start.append(counter('requests'))
+        trace.on_connection_create_end.append(counter('new_connections'))
+        trace.on_connection_reuseconn.append(counter('reused_connections'))
+        trace.on_dns_cache_hit.append(counter('dns_cache_hits'))
+        trace.on_dns_cache_miss.append(counter('dns_cache_misses'))
+        return trace
+
+    async def warmup(self, hosts: Optional[list] = None):
+        """
+        Open keep-alive connections to the given hosts ahead of time
+        Args:
+            hosts: list of hostnames (defaults to HTTP_POOL WARMUP_HOSTS)
+        """
+        hosts = hosts if hosts is not None else self.settings['WARMUP_HOSTS']
+        if not hosts:
+            return
+
+        async def _warm(host):
+            try:
+                async with self.session.head(
+                    f'https://{host}/',
+                    timeout=aiohttp.ClientTimeout(total=10),
+                    allow_redirects=False
+                ):
+                    pass
+            except Exception as e:
+                LOGGER.debug(f"HTTP POOL : Warm-up failed for {host} - {e}")
+
+        await asyncio.gather(*(_warm(host) for host in hosts))
+        LOGGER.info(f"HTTP POOL : Warmed up {len(hosts)} host(s)")
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: pool counters (reused vs new connections, dns cache usage)
+        """
+        stats = self._stats.copy()
+        total = stats['new_connections'] + stats['reused_connections']
+        stats['reuse_ratio'] = round(stats['reused_connections'] / total, 3) if total else 0.0
+        if self._connector is not None and not self._connector.closed:
+            stats['limit'] = self._connector.limit
+            stats['limit_per_host'] = self._connector.limit_per_host
+        return stats
+
+    async def close(self):
+        """Close the shared session and connector"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        if self._connector is not None and not self._connector.closed:
+            await self._connector.close()
+        self._session = None
+        self._connector = None
+
+
+http_pool = HttpPool()
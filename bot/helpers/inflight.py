@@ -0,0 +1,107 @@
+import asyncio
+
+from bot.settings import bot_set
+from bot.logger import LOGGER
+
+from .dispatcher import dispatcher
+from .tidal.utils import parse_url
+from .tidal.tidal_api import tidalapi
+from .qobuz.utils import get_url_info
+from .qobuz.qopy import qobuz_api
+
+
+# settings that change what a job produces (same link + same settings = same result)
+UPLOAD_SETTINGS = (
+    'upload_mode', 'link_options', 'art_poster', 'album_zip', 'artist_zip',
+    'playlist_zip', 'artist_batch', 'playlist_conc', 'playlist_sort', 'disable_sort_link'
+)
+
+
+class Job:
+    def __init__(self, key):
+        self.key = key
+        self.messages = [] # everything the leader sent to its chat while running
+        self.done = asyncio.Event()
+        self.error = None
+
+
+class InflightJobs:
+    """
+    Registry of running download jobs.
+    A request for a link that is already being processed with the same
+    quality and upload settings attaches to the running job and gets a copy
+    of its results instead of starting a second pipeline.
+    """
+    def __init__(self):
+        self.jobs = {}
+
+    async def job_key(self, link:str) -> str | None:
+        """
+        Returns:
+            normalized key (provider, type, id, quality, upload settings) or None
+        """
+        try:
+            if 'tidal.com' in link:
+                item_id, type_ = await parse_url(link)
+                quality = (tidalapi.quality, tidalapi.spatial)
+                provider = 'tidal'
+            elif 'qobuz.com' in link:
+                type_, item_id = await get_url_info(link)
+                quality = (qobuz_api.quality,)
+                provider = 'qobuz'
+            else:
+                return None
+        except Exception:
+            return None
+        if not item_id:
+            return None
+        upload = tuple(str(getattr(bot_set, name, None)) for name in UPLOAD_SETTINGS)
+        return '|'.join(str(i) for i in (provider, type_, item_id, *quality, *upload))
+
+    async def run(self, link:str, user:dict, func):
+        """
+        Run func(link, user) once per job key
+        Args:
+            link: url sent by the user
+            user: user details
+            func: coroutine function doing the actual work (start_link)
+        """
+        key = await self.job_key(link)
+        if key is None:
+            return await func(link, user)
+
+        job = self.jobs.get(key)
+        if job is not None:
+            LOGGER.info(f"JOB : Attaching {user['r_id']} to running job {key}")
+            await job.done.wait()
+            if job.error:
+                raise job.error
+            return await self.forward(job, user)
+
+        job = Job(key)
+        self.jobs[key] = job
+        user['job'] = job
+        try:
+            return await func(link, user)
+        except Exception as e:
+            job.error = e
+            raise
+        finally:
+            # later messages of the leader (TASK_COMPLETED) are not results
+            user['job'] = None
+            del self.jobs[key]
+            job.done.set()
+
+    async def forward(self, job:Job, user:dict):
+        """Copy the results of a finished job to another user's chat"""
+        for msg in list(job.messages):
+            try:
+                await dispatcher.submit(
+                    user['chat_id'],
+                    lambda msg=msg: msg.copy(user['chat_id'], reply_to_message_id=user['r_id'])
+                )
+            except Exception as e:
+                LOGGER.error(f"JOB : Failed to forward result - {e}")
+
+
+inflight = InflightJobs()
@@ -1,6 +1,7 @@
 import os
 import asyncio
 
+from pyrogram import raw, types
 from pyrogram.types import Message
 from pyrogram.errors import MessageNotModified, FloodWait
 
@@ -8,6 +9,8 @@ from bot.tgclient import aio
 from bot.settings import bot_set
 from bot.logger import LOGGER
 
+from .dispatcher import dispatcher, STATUS, PROGRESS
+
 
 current_user = []
 
@@ -20,7 +23,9 @@ user_details = {
     'provider': None,
     'bot_msg': None,
     'link': None,
-    'override' : None # To skip checking media exist
+    'override' : None, # To skip checking media exist
+    'job': None, # in-flight job collecting the results sent to the user
+    'progress': None # JobProgress of the collection being downloaded
 }
 
 
@@ -122,9 +127,9 @@ async def send_message(user, item, itype='text', caption=None, markup=None, chat
         user = await fetch_user_details(user)
     chat_id = chat_id if chat_id else user['chat_id']
 
-    try:
+    async def send():
         if itype == 'text':
-            msg = await aio.send_message(
+            return await aio.send_message(
                 chat_id=chat_id,
                 text=item,
                 reply_to_message_id=user['r_id'],
@@ -133,7 +138,7 @@ async def send_message(user, item, itype='text', caption=None, markup=None, chat
             )
             
         elif itype == 'doc':
-            msg = await aio.send_document(
+            return await aio.send_document(
                 chat_id=chat_id,
                 document=item,
                 caption=caption,
@@ -141,7 +146,7 @@ async def send_message(user, item, itype='text', caption=None, markup=None, chat
             )
 
         elif itype == 'audio':
-            msg = await aio.send_audio(
+            return await aio.send_audio(
                 chat_id=chat_id,
                 audio=item,
                 caption=caption,
@@ -153,33 +158,181 @@ async def send_message(user, item, itype='text', caption=None, markup=None, chat
             )
 
         elif itype == 'pic':
-            msg = await aio.send_photo(
+            return await aio.send_photo(
                 chat_id=chat_id,
                 photo=item,
                 caption=caption,
                 reply_to_message_id=user['r_id']
             )
 
-    except FloodWait as e:
-        await asyncio.sleep(e.value)
-        return await send_message(user, item, itype, caption, markup, chat_id, meta)
-
+    msg = await dispatcher.submit(chat_id, send)
+    if msg and user.get('job'):
+        user['job'].messages.append(msg)
     return msg
 
 
-async def edit_message(msg:Message, text, markup=None, antiflood=True):
-    try:
-        edited = await msg.edit_text(
-            text=text,
-            reply_markup=markup,
-            disable_web_page_preview=True
+async def upload_audio(item, meta) -> raw.types.InputMediaUploadedDocument:
+    """
+    Upload an audio file without sending it (see send_uploaded)
+    Args:
+        item: path of the audio
+        meta: metadata for the audio file
+    """
+    while True:
+        try:
+            file = await aio.save_file(item)
+            thumb = await aio.save_file(meta['thumbnail']) if meta['thumbnail'] else None
+            break
+        except FloodWait as e:
+            await asyncio.sleep(e.value)
+
+    return raw.types.InputMediaUploadedDocument(
+        mime_type=aio.guess_mime_type(item) or 'audio/mpeg',
+        file=file,
+        thumb=thumb,
+        attributes=[
+            raw.types.DocumentAttributeAudio(
+                duration=int(meta['duration']),
+                performer=meta['artist'],
+                title=meta['title']
+            ),
+            raw.types.DocumentAttributeFilename(file_name=os.path.basename(item))
+        ]
+    )
+
+
+async def send_uploaded(user, media, caption=None, chat_id=None):
+    """
+    Send media uploaded with upload_audio
+    Args:
+        user: user details (dict)
+        media: raw input media
+        caption: text
+        chat_id: if override chat from user details
+    """
+    chat_id = chat_id if chat_id else user['chat_id']
+
+    async def send():
+        return await aio.invoke(
+            raw.functions.messages.SendMedia(
+                peer=await aio.resolve_peer(chat_id),
+                media=media,
+                reply_to_msg_id=user['r_id'],
+                random_id=aio.rnd_id(),
+                message=caption or ''
+            )
         )
-        return edited
-    except MessageNotModified:
-        return None
-    except FloodWait as e:
-        if antiflood:
+
+    r = await dispatcher.submit(chat_id, send)
+
+    msg = None
+    for update in r.updates:
+        if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)):
+            msg = await types.Message._parse(
+                aio,
+                update.message,
+                {i.id: i for i in r.users},
+                {i.id: i for i in r.chats}
+            )
+            break
+
+    if msg and user.get('job'):
+        user['job'].messages.append(msg)
+    return msg
+
+
+async def group_media(user, media, chat_id=None) -> raw.types.InputMediaDocument:
+    """
+    Turn uploaded media into a document usable in a media group
+    (media groups only accept media already stored on telegram)
+    """
+    chat_id = chat_id if chat_id else user['chat_id']
+    while True:
+        try:
+            r = await aio.invoke(
+                raw.functions.messages.UploadMedia(
+                    peer=await aio.resolve_peer(chat_id),
+                    media=media
+                )
+            )
+            break
+        except FloodWait as e:
             await asyncio.sleep(e.value)
-            return await edit_message(msg, text, markup, antiflood)
-        else:
-            return None
\ No newline at end of file
+    return raw.types.InputMediaDocument(
+        id=raw.types.InputDocument(
+            id=r.document.id,
+            access_hash=r.document.access_hash,
+            file_reference=r.document.file_reference
+        )
+    )
+
+
+async def send_uploaded_group(user, medias:list, chat_id=None) -> list:
+    """
+    Send up to 10 media from group_media as one media group
+    Args:
+        user: user details (dict)
+        medias: list of (media, caption)
+        chat_id: if override chat from user details
+    Returns:
+        list of messages in the given order
+    """
+    chat_id = chat_id if chat_id else user['chat_id']
+
+    async def send():
+        return await aio.invoke(
+            raw.functions.messages.SendMultiMedia(
+                peer=await aio.resolve_peer(chat_id),
+                multi_media=[
+                    raw.types.InputSingleMedia(
+                        media=media,
+                        random_id=aio.rnd_id(),
+                        message=caption or ''
+                    )
+                    for media, caption in medias
+                ],
+                reply_to_msg_id=user['r_id']
+            )
+        )
+
+    r = await dispatcher.submit(chat_id, send)
+
+    users = {i.id: i for i in r.users}
+    chats = {i.id: i for i in r.chats}
+    msgs = []
+    for update in r.updates:
+        if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)):
+            msgs.append(await types.Message._parse(aio, update.message, users, chats))
+    msgs.sort(key=lambda msg: msg.id)
+
+    if user.get('job'):
+        user['job'].messages.extend(msgs)
+    return msgs
+
+
+async def edit_message(msg:Message, text, markup=None, antiflood=True):
+    """
+    Args:
+        msg: message to edit
+        text: new text
+        markup: buttons
+        antiflood: False for progress updates (sent last, dropped while flooded)
+    Returns:
+        edited message or None
+    """
+    async def edit():
+        try:
+            return await msg.edit_text(
+                text=text,
+                reply_markup=markup,
+                disable_web_page_preview=True
+            )
+        except MessageNotModified:
+            return None
+
+    return await dispatcher.submit(
+        msg.chat.id,
+        edit,
+        STATUS if antiflood else PROGRESS,
+        key=('edit', msg.id)
+    )
\ No newline at end of file
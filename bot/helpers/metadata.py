@@ -1,4 +1,10 @@
 import os
+import time
+import asyncio
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from mutagen import File
 from config import Config
@@ -8,7 +14,7 @@ from mutagen.id3 import TALB, TCOP, TDRC, TIT2, TPE1, TRCK, APIC, \
     TCON, TOPE, TSRC, USLT, TPOS, TXXX
 
 from bot.logger import LOGGER
-from .utils import download_file
+from .disk_cache import cover_cache
 
 
 metadata = {
@@ -40,27 +46,250 @@ metadata = {
         'filepath': '',   # if track, full path to file
         'folderpath': '', # if album/playlist the full path to folder
         'poster_msg': None,  # Pyrogram message of post (if exist)
+        'media_key': None, # (provider, id, quality) for telegram file_id cache
+        'cover_task': None, # task giving (cover, thumbnail) while it is prefetched
+        'uploader': None, # TelegramUploader fed while the tracks download
         'type': ''       # track/album/playlist/artist
     }
 
 
-async def set_metadata(metadata:dict):
-    audio_path = metadata['filepath']
+# album level fields a track reads from its album while it has no own value
+SHARED_FIELDS = frozenset((
+    'copyright', 'albumartist', 'artist', 'album', 'upc', 'date', 'totaltracks',
+    'totalvolume', 'genre', 'explicit', 'provider', 'quality', 'cover',
+    'thumbnail', 'tempfolder'
+))
 
-    handle = File(audio_path)
 
-    if metadata['duration'] == '':
-        metadata['duration'] = handle.info.length
+class Meta:
+    """
+    Slotted metadata record with the dict interface of the metadata template.
+    Unset fields read the template default, or the parent's value for
+    SHARED_FIELDS, so tracks of an album share its fields by reference
+    instead of holding deep copies.
+    Args:
+        parent: album/collection the record belongs to
+        fields: initial field values
+    """
+    __slots__ = ('parent',)
+    FIELDS = frozenset()
 
-    if 'audio/x-flac' in handle.mime:
-        await set_flac(metadata, handle)
-    elif 'audio/mpeg' in handle.mime:
-        await set_mp3(metadata, handle)
-    elif 'audio/x-m4a' in handle.mime: 
-        await set_m4a(metadata, handle)
+    def __init__(self, parent=None, **fields):
+        self.parent = parent
+        for key, value in fields.items():
+            self[key] = value
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            pass
+        if key in SHARED_FIELDS and self.parent is not None:
+            return self.parent[key]
+        if key not in metadata:
+            raise KeyError(key)
+        value = metadata[key]
+        if isinstance(value, list):
+            # never hand out the template's list
+            value = []
+            if key in self.FIELDS:
+                setattr(self, key, value)
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in metadata
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return metadata.keys()
+
+    def items(self):
+        return ((key, self[key]) for key in metadata)
+
+    def copy(self):
+        """Shallow copy (same parent)"""
+        other = type(self)(self.parent)
+        for key in self.FIELDS:
+            if hasattr(self, key):
+                setattr(other, key, getattr(self, key))
+        return other
+
+    def to_dict(self) -> dict:
+        return dict(self.items())
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.get('type')}, {self.get('itemid')!r}, {self.get('title')!r})"
+
+
+class TrackMeta(Meta):
+    """Metadata of a single track"""
+    FIELDS = frozenset(metadata) - {'tracks', 'albums', 'poster_msg', 'uploader'}
+    __slots__ = tuple(FIELDS)
+
+
+class CollectionMeta(Meta):
+    """Metadata of an album/playlist/artist"""
+    FIELDS = frozenset(metadata)
+    __slots__ = tuple(FIELDS)
+
+
+# room for the text tags on top of cover and lyrics
+TAG_RESERVE_SLACK = 64 * 1024
+
+
+def tag_reserve(data:dict) -> int:
+    """
+    Padding to reserve in a FLAC while it downloads so that tagging fits
+    in place (see downloader.close_reserve)
+    Returns:
+        bytes to reserve
+    """
+    try:
+        cover = os.path.getsize(data['cover']) if data['cover'] else 0
+    except OSError:
+        cover = 0
+    return cover + len(str(data['lyrics']).encode()) + TAG_RESERVE_SLACK
+
+
+def _keep_padding(info):
+    # use the reserved padding as is, shrinking it would move the audio
+    return info.padding if info.padding >= 0 else info.get_default_padding()
 
 
-async def set_flac(data, handle):
+class Tagger:
+    """
+    Runs mutagen off the event loop.
+    Each file is parsed once in a worker thread, which gives both its
+    extension and the handle that gets tagged and saved. Cover bytes are read
+    once per cover file and shared by all the tracks of an album.
+    """
+    COVER_SLOTS = 16
+
+    def __init__(self):
+        self.pool = ThreadPoolExecutor(
+            max_workers=Config.PERFORMANCE['WORKER_THREADS'],
+            thread_name_prefix='tagger'
+        )
+        self._covers = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'files': 0,
+            'failed': 0,
+            'cover_reads': 0,
+            'parse_time': 0.0,
+            'tag_time': 0.0,
+            'save_time': 0.0
+        }
+
+    async def tag(self, data:dict, path:str=None) -> str:
+        """
+        Args:
+            data: track metadata
+            path: file to tag (default: data['filepath'])
+        Returns:
+            extension detected while parsing (flac/m4a/mp3)
+        """
+        loop = asyncio.get_running_loop()
+        extension, duration = await loop.run_in_executor(
+            self.pool, self._tag, data.copy(), path or data['filepath']
+        )
+        if data['duration'] == '' and duration is not None:
+            data['duration'] = duration
+        return extension
+
+    def _tag(self, data:dict, path:str) -> tuple:
+        start = time.perf_counter()
+        handle = File(path)
+        parsed = time.perf_counter()
+        if handle is None:
+            with self._lock:
+                self._stats['failed'] += 1
+            LOGGER.warning(f"TAGGER : Unknown audio format - {path}")
+            return 'mp3', None
+
+        extension = 'mp3'
+        if 'audio/x-m4a' in handle.mime:
+            extension = 'm4a'
+            set_m4a(data, handle)
+        elif 'audio/x-flac' in handle.mime:
+            extension = 'flac'
+            set_flac(data, handle)
+        elif 'audio/mpeg' in handle.mime:
+            set_mp3(data, handle)
+        save_pic(handle, self._cover(data['cover']))
+        tagged = time.perf_counter()
+        if extension == 'flac':
+            handle.save(padding=_keep_padding)
+        else:
+            handle.save()
+        saved = time.perf_counter()
+
+        with self._lock:
+            self._stats['files'] += 1
+            self._stats['parse_time'] += parsed - start
+            self._stats['tag_time'] += tagged - parsed
+            self._stats['save_time'] += saved - tagged
+        return extension, handle.info.length
+
+    def _cover(self, cover:str) -> bytes | None:
+        if not cover:
+            return None
+        with self._lock:
+            if cover in self._covers:
+                self._covers.move_to_end(cover)
+                return self._covers[cover]
+        try:
+            with open(cover, "rb") as f:
+                data = f.read()
+        except Exception as e:
+            LOGGER.error(f"TAGGER : Failed to read cover - {e}")
+            return None
+        with self._lock:
+            self._stats['cover_reads'] += 1
+            self._covers[cover] = data
+            while len(self._covers) > self.COVER_SLOTS:
+                self._covers.popitem(last=False)
+        return data
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: tagged file count and time spent per stage (seconds)
+        """
+        with self._lock:
+            stats = self._stats.copy()
+        for key in ('parse_time', 'tag_time', 'save_time'):
+            stats[key] = round(stats[key], 3)
+        files = stats['files']
+        stats['avg_time'] = round(
+            (stats['parse_time'] + stats['tag_time'] + stats['save_time']) / files, 4
+        ) if files else 0.0
+        return stats
+
+
+tagger = Tagger()
+
+
+async def set_metadata(metadata:dict) -> str:
+    """
+    Tag metadata['filepath'] in the tagger pool
+    Returns:
+        extension of the file
+    """
+    return await tagger.tag(metadata)
+
+
+def set_flac(data, handle):
     if handle.tags is None:
             handle.add_tags()
     handle.tags['title'] = data['title']
@@ -74,11 +303,9 @@ async def set_flac(data, handle):
     handle.tags['date'] = data['date']
     handle.tags['isrc'] = data['isrc']
     handle.tags['lyrics'] = data['lyrics']
-    await savePic(handle, data)
-    handle.save()
     return True
 
-async def set_mp3(data, handle):
+def set_mp3(data, handle):
     # ID3
     if handle.tags is None:
             handle.add_tags()
@@ -94,11 +321,9 @@ async def set_mp3(data, handle):
     handle.tags.add(TDRC(encoding=3, text=data['date']))
     handle.tags.add(TSRC(encoding=3, text=data['isrc']))
     handle.tags.add(USLT(encoding=3, lang=u'eng', desc=u'desc', text=data['lyrics']))
-    await savePic(handle, data)
-    handle.save()
     return True
 
-async def set_m4a(data, handle):
+def set_m4a(data, handle):
     if handle.tags is None:
         handle.add_tags()
     handle.tags['\u00a9nam'] = data['title']
@@ -115,21 +340,11 @@ async def set_m4a(data, handle):
     volume = int(data['volume']) if data['volume'] != '' else 0
     totalvolume = int(data['totalvolume']) if data['totalvolume'] != '' else 0
     handle.tags['disk'] = [(volume, totalvolume)]
-
-
-    await savePic(handle, data)
-    handle.save()
     return True
 
 
-async def savePic(handle, metadata):
-    album_art = metadata['cover']
-
-    try:
-        with open(album_art, "rb") as f:
-            data = f.read()
-    except Exception as e:
-        await LOGGER.error(e)
+def save_pic(handle, data:bytes | None):
+    if not data:
         return
 
     if 'audio/x-flac' in handle.mime:
@@ -150,24 +365,33 @@ async def savePic(handle, metadata):
         handle['artwork'] = data
 
 
-
 async def get_audio_extension(path):
-    handle = File(path)
+    handle = await asyncio.get_running_loop().run_in_executor(tagger.pool, File, path)
     
-    if 'audio/x-m4a' in handle.mime:
+    if handle is not None and 'audio/x-m4a' in handle.mime:
         return 'm4a'
-    elif 'audio/x-flac' in handle.mime:
+    elif handle is not None and 'audio/x-flac' in handle.mime:
         return 'flac'
     else:
         return 'mp3'
 
 
-async def create_cover_file(url:dict, meta:dict, thumbnail=False):
-    filename = f"{meta['itemid']}-thumb.jpg" if thumbnail else f"{meta['itemid']}.jpg"
-    cover = meta['tempfolder'] + filename
-    
-    if not os.path.exists(cover):
-        err = await download_file(url, cover, 1, 5)
-        if err:
-            return './project-siesta.png'
-    return cover
\ No newline at end of file
+async def create_cover_files(url, meta:dict, image_id=None) -> tuple:
+    """
+    Args:
+        url: full size cover url
+        meta: metadata (tempfolder, itemid, provider)
+        image_id: provider image id used as cache key (default: url)
+    Returns:
+        (cover path, thumbnail path)
+    """
+    cover = meta['tempfolder'] + f"{meta['itemid']}.jpg"
+    thumbnail = meta['tempfolder'] + f"{meta['itemid']}-thumb.jpg"
+
+    if os.path.exists(cover) and os.path.exists(thumbnail):
+        return cover, thumbnail
+    if url:
+        key = cover_cache.key(meta['provider'], image_id or url)
+        if await cover_cache.covers(key, url, cover, thumbnail):
+            return cover, thumbnail
+    return './project-siesta.png', './project-siesta.png'
@@ -0,0 +1,165 @@
+import math
+import time
+import asyncio
+
+from collections import deque
+
+import bot.helpers.translations as lang
+from bot.logger import LOGGER
+
+from .message import edit_message
+
+
+PROGRESS_INTERVAL = 5 # seconds between progress edits
+SPEED_WINDOW = 4 # ticks the speed is averaged over
+
+
+def format_size(size:float) -> str:
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f"{size:.2f} {unit}"
+        size /= 1024
+    return f"{size:.2f} TB"
+
+
+def format_eta(seconds) -> str:
+    if seconds is None:
+        return '--'
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    return f"{seconds // 60}m {seconds % 60:02d}s"
+
+
+def progress_bar(done, total) -> str:
+    filled = min(10, math.floor(done / total * 10)) if total else 0
+    return "▰" * filled + "▱" * (10 - filled)
+
+
+class JobProgress:
+    """
+    Progress of one job shown on its bot message.
+    Tasks only record their state in memory (task_done, update - also safe
+    from worker threads) and a single ticker renders the latest state with
+    the aggregate speed and ETA every PROGRESS_INTERVAL seconds, so the
+    number of edits follows the job duration instead of the track count.
+    Args:
+        msg: bot message to edit
+        text: DOWNLOAD_PROGRESS like template (counting tasks) or a header (counting bytes)
+        title: item title
+        kind: item type
+    """
+    def __init__(self, msg, text, title='', kind=''):
+        self.msg = msg
+        self.text = text
+        self.title = title
+        self.kind = kind
+        self.tasks = 0
+        self.done = 0
+        self.files = {} # key -> (done_bytes, total_bytes or None)
+        self._samples = deque(maxlen=SPEED_WINDOW + 1)
+        self._ticker = None
+        self._last = None
+
+    def start(self, tasks=0):
+        """
+        Args:
+            tasks: number of tasks (0 to show bytes only)
+        """
+        self.tasks = tasks
+        if self._ticker is None and self.msg:
+            self._ticker = asyncio.create_task(self._tick())
+        return self
+
+    async def stop(self):
+        """Stop the ticker and show the final state"""
+        if self._ticker is None:
+            return
+        self._ticker.cancel()
+        try:
+            await self._ticker
+        except asyncio.CancelledError:
+            pass
+        self._ticker = None
+        self._sample()
+        await self._render()
+
+    def task_done(self):
+        self.done += 1
+
+    def update(self, key, done:int, total:int | None = None):
+        self.files[key] = (done, total)
+
+    def callback(self, key):
+        """
+        Returns:
+            async callback(done_bytes, total_bytes) recording under key
+        """
+        async def progress(done, total=None, *_):
+            self.update(key, done, total)
+        return progress
+
+    def _bytes(self) -> tuple:
+        # one C level copy, zip threads may update while the loop reads
+        files = tuple(self.files.values())
+        done = sum(d for d, _ in files)
+        known = [(d, t) for d, t in files if t]
+        return done, files, known
+
+    def _sample(self):
+        self._samples.append((time.monotonic(), self._bytes()[0]))
+
+    def speed(self) -> float:
+        if len(self._samples) < 2:
+            return 0
+        (t0, b0), (t1, b1) = self._samples[0], self._samples[-1]
+        return (b1 - b0) / (t1 - t0) if t1 > t0 else 0
+
+    def eta(self, speed:float) -> float | None:
+        done, files, known = self._bytes()
+        if not speed or not known:
+            return None
+        remaining = sum(t - d for d, t in known if t > d)
+        if self.tasks:
+            # tracks not started yet are guessed from the average size
+            running = sum(1 for d, t in files if not t or d < t)
+            waiting = max(0, self.tasks - self.done - running)
+            remaining += waiting * sum(t for _, t in known) / len(known)
+        return remaining / speed
+
+    def render(self) -> str:
+        if self.tasks:
+            text = self.text.format(
+                progress_bar(self.done, self.tasks),
+                self.done,
+                self.tasks,
+                self.title,
+                self.kind.title()
+            )
+        else:
+            done, _, known = self._bytes()
+            total = sum(t for _, t in known)
+            percent = min(100, done * 100 // total) if total else 0
+            text = f"{self.text}\n{progress_bar(done, total)} {percent}%"
+        speed = self.speed()
+        if speed:
+            text += lang.s.PROGRESS_SPEED.format(format_size(speed), format_eta(self.eta(speed)))
+        return text
+
+    async def _render(self):
+        text = self.render()
+        if text == self._last:
+            return
+        try:
+            if await edit_message(self.msg, text, None, False) is not None:
+                self._last = text
+        except Exception as e:
+            LOGGER.debug(f"PROGRESS : Edit failed - {e}")
+
+    async def _tick(self):
+        self._sample()
+        await self._render()
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            self._sample()
+            await self._render()
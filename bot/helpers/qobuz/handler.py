@@ -5,7 +5,13 @@ from config import Config
 from pathvalidate import sanitize_filepath
 
 from ..utils import *
-from ..metadata import set_metadata
+from ..metadata import set_metadata, tag_reserve
+from ..disk_cache import track_cache
+from ..tg_files import media_key, get_file_ids, send_cached
+from ..zipper.incremental import incremental_zipper
+from ..tg_uploader import TelegramUploader
+from ..progress import JobProgress
+from ..scheduler import download_scheduler
 
 from ..uploder import track_upload, album_upload, artist_upload, playlist_upload
 
@@ -28,7 +34,7 @@ async def start_qobuz(url:str, user:dict):
             await start_track(item_id, user, None)
 
 
-async def start_album(item_id:int, user:dict, upload=True, basefolder=None):
+async def start_album(item_id:int, user:dict, upload=True, basefolder=None, zipper=None):
     album_meta, err = await get_album_metadata(item_id, user['r_id'])
     if err:
         return await send_message(user, err)
@@ -37,11 +43,17 @@ async def start_album(item_id:int, user:dict, upload=True, basefolder=None):
     track_meta = await qobuz_api.get_track_url(album_meta['tracks'][0]['itemid'])
 
     _, album_meta['quality'] = await get_quality(track_meta)
+    album_meta['media_key'] = media_key(album_meta['provider'], item_id, qobuz_api.quality)
     
     # for convenience, do not post album poster if artist
     if upload:
         album_meta['poster_msg'] = await post_art_poster(user, album_meta)
 
+    telegram = upload and bot_set.upload_mode == 'Telegram'
+    if telegram and bot_set.album_zip:
+        if await send_cached(user, album_meta['media_key'], 'zip', 'doc', await create_simple_text(album_meta, user)):
+            return
+
     if basefolder:
         album_folder = basefolder + f"/{album_meta['title']}"
     else:
@@ -49,28 +61,53 @@ async def start_album(item_id:int, user:dict, upload=True, basefolder=None):
     album_folder = sanitize_filepath(album_folder)
     album_meta['folderpath'] = album_folder
     
-    # concurrent
-    tasks = []
-    for track in album_meta['tracks']:
-        tasks.append(start_track(track['itemid'], user, track, False, album_folder))
-        
-    
-    update_details = {
-        'text': lang.s.DOWNLOAD_PROGRESS,
-        'msg': user['bot_msg'],
-        'title': album_meta['title'],
-        'type': album_meta['type']
-    }
-    await run_concurrent_tasks(tasks, update_details)
-
+    # zipper passed by artist when the whole artist is zipped
+    own_zipper = None
     if bot_set.album_zip:
-        await edit_message(user['bot_msg'], lang.s.ZIPPING)
-        album_meta['folderpath'] = await zip_handler(album_meta['folderpath'])
+        zipper = own_zipper = incremental_zipper(album_folder)
 
-    # Upload
-    if upload:
-        await edit_message(user['bot_msg'], lang.s.UPLOADING)
-        await album_upload(album_meta, user)
+    try:
+        # tracks are uploaded while the rest download
+        if telegram and not bot_set.album_zip:
+            album_meta['uploader'] = TelegramUploader(user, album_meta['tracks'])
+
+        # concurrent
+        tasks = []
+        for track in album_meta['tracks']:
+            track['media_key'] = media_key(track['provider'], track['itemid'], qobuz_api.quality)
+            if telegram and not bot_set.album_zip and get_file_ids(track['media_key'], 'audio'):
+                # resent by file_id in its turn
+                album_meta['uploader'].cached(
+                    track,
+                    lambda track=track: start_track(track['itemid'], user, track, False, album_folder)
+                )
+                continue
+            task = start_track(track['itemid'], user, track, False, album_folder)
+            if zipper:
+                task = zipper.track(task, track)
+            elif album_meta['uploader']:
+                task = album_meta['uploader'].track(task, track)
+            tasks.append(task)
+
+
+        user['progress'] = JobProgress(user['bot_msg'], lang.s.DOWNLOAD_PROGRESS, album_meta['title'], album_meta['type'])
+        await run_concurrent_tasks(tasks, user['progress'], user)
+
+        if bot_set.album_zip:
+            await edit_message(user['bot_msg'], lang.s.ZIPPING)
+            if zipper:
+                album_meta['folderpath'] = await zipper.finish()
+            else:
+                album_meta['folderpath'] = await zip_handler(album_meta['folderpath'], user['bot_msg'])
+
+        # Upload
+        if upload:
+            await edit_message(user['bot_msg'], lang.s.UPLOADING)
+            await album_upload(album_meta, user)
+    finally:
+        if own_zipper:
+            # no-op after finish(), cleans up a failed job
+            await own_zipper.close()
 
 
 async def start_track(item_id:int, user:dict, track_meta:dict | None, upload=True, basefolder=None, disable_link=False, disable_msg=False):
@@ -99,25 +136,50 @@ async def start_track(item_id:int, user:dict, track_meta:dict | None, upload=Tru
         else:
             filepath = basefolder
         
-    raw_data = await qobuz_api.get_track_url(item_id)
-    try:
-        url = raw_data['url']
-    except KeyError:
-        return await send_message(user, lang.s.ERR_QOBUZ_NOT_AVAILABLE)
-        
-    track_meta['extension'], track_meta['quality'] = await get_quality(raw_data)
+    track_meta['media_key'] = media_key(track_meta['provider'], item_id, qobuz_api.quality)
+    if upload and bot_set.upload_mode == 'Telegram':
+        await wait_cover(track_meta)
+        # already uploaded once, resend by file_id
+        if await send_cached(user, track_meta['media_key'], 'audio', 'audio', meta=track_meta):
+            return True
+
+    cache_key = track_cache.key(track_meta['provider'], item_id, qobuz_api.quality)
+    cached = track_cache.get(cache_key)
+    if cached:
+        track_meta['extension'], track_meta['quality'] = cached['extension'], cached['quality']
+    else:
+        raw_data = await qobuz_api.get_track_url(item_id)
+        try:
+            url = raw_data['url']
+        except KeyError:
+            return await send_message(user, lang.s.ERR_QOBUZ_NOT_AVAILABLE)
+            
+        track_meta['extension'], track_meta['quality'] = await get_quality(raw_data)
 
     # add filename to filepath
-    filename = await format_string(Config.TRACK_NAME_FORMAT, track_meta, user)
+    filename = format_text(Config.TRACK_NAME_FORMAT, track_meta, user)
     filepath += f"/{filename}.{track_meta['extension']}"
     filepath = sanitize_filepath(filepath)
     track_meta['filepath'] = filepath
+    # playlist covers are prefetched, needed from here (padding size, tags, thumbnail)
+    await wait_cover(track_meta)
 
-    err = await download_file(url, filepath)
-    if err:
-        return await send_message(user, err)
-    
-    await set_metadata(track_meta)
+    if cached:
+        # already tagged
+        await track_cache.fetch(cached, filepath)
+    else:
+        reserve = tag_reserve(track_meta) if track_meta['extension'] == 'flac' else 0
+        err = await download_file(url, filepath, segmented=True, reserve=reserve, progress=user.get('progress'))
+        if err:
+            return await send_message(user, err)
+        
+        await set_metadata(track_meta)
+        await track_cache.put(
+            cache_key,
+            filepath,
+            extension=track_meta['extension'],
+            quality=track_meta['quality']
+        )
 
     if upload:
         await track_upload(track_meta, user, disable_link)
@@ -139,18 +201,30 @@ async def start_artist(albums, user, artist):
     if bot_set.artist_zip:
         upload_album = False # final decision
 
-    # no concurrent download
-    for album in albums:
-        await start_album(album['id'], user, upload_album, artist_meta['folderpath'])
+    zipper = None
+    if bot_set.artist_zip and not bot_set.album_zip:
+        zipper = incremental_zipper(artist_meta['folderpath'])
 
-    # now upload artist folder as a whole
-    if not upload_album:
-        if bot_set.artist_zip:
-            await edit_message(user['bot_msg'], lang.s.ZIPPING)
-            artist_meta['folderpath'] = await zip_handler(artist_meta['folderpath'])
-        
-        await edit_message(user['bot_msg'], lang.s.UPLOADING)
-        await artist_upload(artist_meta, user)
+    try:
+        # no concurrent download
+        for album in albums:
+            await start_album(album['id'], user, upload_album, artist_meta['folderpath'], zipper)
+
+        # now upload artist folder as a whole
+        if not upload_album:
+            if bot_set.artist_zip:
+                await edit_message(user['bot_msg'], lang.s.ZIPPING)
+                if zipper:
+                    artist_meta['folderpath'] = await zipper.finish()
+                else:
+                    artist_meta['folderpath'] = await zip_handler(artist_meta['folderpath'], user['bot_msg'])
+
+            await edit_message(user['bot_msg'], lang.s.UPLOADING)
+            await artist_upload(artist_meta, user)
+    finally:
+        if zipper:
+            # no-op after finish(), cleans up a failed job
+            await zipper.close()
 
 
 
@@ -171,36 +245,52 @@ async def start_playlist(tracks, playlist, user):
     track_meta = await qobuz_api.get_track_url(tracks[0]['id'])
     _, play_meta['quality'] = await get_quality(track_meta)
 
-    update_details = {
-        'text': lang.s.DOWNLOAD_PROGRESS,
-        'msg': user['bot_msg'],
-        'title': play_meta['title'],
-        'type': play_meta['type']
-    }
+    user['progress'] = JobProgress(user['bot_msg'], lang.s.DOWNLOAD_PROGRESS, play_meta['title'], play_meta['type'])
 
     play_meta['poster_msg'] = await post_art_poster(user, play_meta)
 
-    upload = True
-    if bot_set.playlist_conc:
-        upload = False
-        tasks = []
-        for track in play_meta['tracks']:
-            tasks.append(start_track(track['itemid'], user, track, upload, playlist_folder))
-        await run_concurrent_tasks(tasks, update_details)
-    else:
-        i = 0
-        if bot_set.playlist_zip: upload = False
-        for track in play_meta['tracks']:
-            await progress_message(i, len(play_meta['tracks']), update_details)
-            await start_track(track['itemid'], user, track, upload, playlist_folder, bot_set.disable_sort_link, True)
-            i+=1
-
-    if bot_set.playlist_zip:
-        await edit_message(user['bot_msg'], lang.s.ZIPPING)
-        if playlist_sort:
-            play_meta['folderpath'] = await move_sorted_playlist(play_meta, user)
-        play_meta['folderpath'] = await zip_handler(play_meta['folderpath'])
-       
-    if not upload:
-        await edit_message(user['bot_msg'], lang.s.UPLOADING)
-        await playlist_upload(play_meta, user)
\ No newline at end of file
+    # sorted playlists are only moved into one folder at the end
+    zipper = incremental_zipper(playlist_folder) if bot_set.playlist_zip else None
+
+    try:
+        upload = True
+        if bot_set.playlist_conc:
+            upload = False
+            if bot_set.upload_mode == 'Telegram' and not bot_set.playlist_zip:
+                play_meta['uploader'] = TelegramUploader(user, play_meta['tracks'])
+            tasks = []
+            for track in play_meta['tracks']:
+                task = start_track(track['itemid'], user, track, upload, playlist_folder)
+                if zipper:
+                    task = zipper.track(task, track)
+                elif play_meta['uploader']:
+                    task = play_meta['uploader'].track(task, track)
+                tasks.append(task)
+            await run_concurrent_tasks(tasks, user['progress'], user)
+        else:
+            if bot_set.playlist_zip: upload = False
+            user['progress'].start(len(play_meta['tracks']))
+            try:
+                for track in play_meta['tracks']:
+                    task = start_track(track['itemid'], user, track, upload, playlist_folder, bot_set.disable_sort_link, True)
+                    await download_scheduler.run(zipper.track(task, track) if zipper else task, user)
+                    user['progress'].task_done()
+            finally:
+                await user['progress'].stop()
+
+        if bot_set.playlist_zip:
+            await edit_message(user['bot_msg'], lang.s.ZIPPING)
+            if zipper:
+                play_meta['folderpath'] = await zipper.finish()
+            else:
+                if playlist_sort:
+                    play_meta['folderpath'] = await move_sorted_playlist(play_meta, user)
+                play_meta['folderpath'] = await zip_handler(play_meta['folderpath'], user['bot_msg'])
+
+        if not upload:
+            await edit_message(user['bot_msg'], lang.s.UPLOADING)
+            await playlist_upload(play_meta, user)
+    finally:
+        if zipper:
+            # no-op after finish(), cleans up a failed job
+            await zipper.close()
@@ -1,25 +1,29 @@
 # From vitiko98/qobuz-dl
 import re
-import copy
+import asyncio
 import bot.helpers.translations as lang
 
 from .qopy import qobuz_api
 from ..message import send_message, edit_message
 from ..utils import format_string
-from ..metadata import metadata as base_meta
-from ..metadata import create_cover_file
+from ..metadata import TrackMeta, CollectionMeta
+from ..metadata import create_cover_files
 
 from bot.settings import bot_set
 from config import Config
 
 
+# covers fetched at the same time while building a playlist
+COVER_PREFETCH = 8
 
-async def get_track_metadata(item_id, r_id, q_meta=None):
+
+async def get_track_metadata(item_id, r_id, q_meta=None, covers=True):
     """
     Args:
         item_id : track id
         r_id: reply to message id
         q_meta : raw metadata from qobuz (pre-fetched)
+        covers: fetch the cover now (else set by the caller)
     """
     if q_meta is None:
         raw_meta = await qobuz_api.get_track_url(item_id)
@@ -30,7 +34,7 @@ async def get_track_metadata(item_id, r_id, q_meta=None):
         else:
             return None, lang.s.ERR_QOBUZ_NOT_STREAMABLE
     
-    metadata = copy.deepcopy(base_meta)
+    metadata = TrackMeta()
 
     metadata['tempfolder'] += f"{r_id}-temp/"
 
@@ -54,8 +58,10 @@ async def get_track_metadata(item_id, r_id, q_meta=None):
     metadata['provider'] = 'Qobuz'
     metadata['type'] = 'track'
 
-    metadata['cover'] = await create_cover_file(q_meta['album']['image']['large'], metadata)
-    metadata['thumbnail'] = await create_cover_file(q_meta['album']['image']['thumbnail'], metadata, True)
+    if covers:
+        metadata['cover'], metadata['thumbnail'] = await create_cover_files(
+            q_meta['album']['image']['large'], metadata, q_meta['album']['id']
+        )
 
     return metadata, None  
         
@@ -64,7 +70,7 @@ async def get_album_metadata(item_id, r_id):
     if not q_meta.get('streamable'):
         return None, lang.s.ERR_QOBUZ_NOT_STREAMABLE
     
-    metadata = copy.deepcopy(base_meta)
+    metadata = CollectionMeta()
 
     metadata['tempfolder'] += f"{r_id}-temp/"
 
@@ -83,8 +89,7 @@ async def get_album_metadata(item_id, r_id):
     metadata['provider'] = 'Qobuz'
     metadata['type'] = 'album'
 
-    metadata['cover'] = await create_cover_file(q_meta['image']['large'], metadata)
-    metadata['thumbnail'] = await create_cover_file(q_meta['image']['thumbnail'], metadata, True)
+    metadata['cover'], metadata['thumbnail'] = await create_cover_files(q_meta['image']['large'], metadata, item_id)
 
     metadata['tracks'] = await get_track_meta_from_alb(q_meta, metadata)
 
@@ -97,7 +102,8 @@ async def get_track_meta_from_alb(q_meta:dict, alb_meta):
     """
     tracks = []
     for track in q_meta['tracks']['items']:
-        metadata = copy.deepcopy(alb_meta)
+        # album fields are read from alb_meta
+        metadata = TrackMeta(alb_meta)
         metadata['itemid'] = track['id']
 
         metadata['title'] = track['title']
@@ -108,7 +114,6 @@ async def get_track_meta_from_alb(q_meta:dict, alb_meta):
         metadata['duration'] = track['duration']
         metadata['isrc'] = track['isrc']
         metadata['tracknumber'] = track['track_number']
-        metadata['tracks'] = '' # clear it
         metadata['type'] = 'track'
         tracks.append(metadata)
     return tracks
@@ -121,7 +126,7 @@ async def get_playlist_meta(raw_meta, tracks, r_id):
         tracks : list of tracks (raw metadata)
         r_id: reply to message id
     """
-    metadata = copy.deepcopy(base_meta)
+    metadata = CollectionMeta()
 
     metadata['tempfolder'] += f"{r_id}-temp/"
 
@@ -134,17 +139,43 @@ async def get_playlist_meta(raw_meta, tracks, r_id):
     metadata['cover'] = './project-siesta.png' #cannot get real playlist image
     metadata['thumbnail'] = './project-siesta.png'
     
+    # one cover per album, fetched in the background while tracks start
+    covers = {}
+    semaphore = asyncio.Semaphore(COVER_PREFETCH)
     for track in tracks:
-        track_meta, _ = await get_track_metadata(track['id'], r_id, track)
+        track_meta, _ = await get_track_metadata(track['id'], r_id, track, False)
+        album = track['album']
+        if album['id'] not in covers:
+            covers[album['id']] = asyncio.create_task(
+                prefetch_cover(album, metadata['tempfolder'], semaphore)
+            )
+        track_meta['cover_task'] = covers[album['id']]
         metadata['tracks'].append(track_meta)
     return metadata
 
+
+async def prefetch_cover(album:dict, tempfolder:str, semaphore:asyncio.Semaphore) -> tuple:
+    """
+    Returns:
+        (cover path, thumbnail path) of the album, shared by its tracks
+    """
+    meta = {'tempfolder': tempfolder, 'itemid': album['id'], 'provider': 'Qobuz'}
+    async with semaphore:
+        return await create_cover_files(album['image']['large'], meta, album['id'])
+
+
+async def wait_cover(meta:dict):
+    """Fill cover/thumbnail of a track whose cover is still being prefetched"""
+    if meta['cover_task'] is not None:
+        meta['cover'], meta['thumbnail'] = await meta['cover_task']
+        meta['cover_task'] = None
+
 async def get_artist_meta(artist_raw):
     """
     Args:
         artist_raw : raw metadata of artist from qobuz
     """
-    metadata = copy.deepcopy(base_meta)
+    metadata = CollectionMeta()
     metadata['title'] = artist_raw['name']
     metadata['type'] = 'artist'
     metadata['provider'] = 'Qobuz'
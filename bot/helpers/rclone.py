@@ -0,0 +1,239 @@
+import os
+import shutil
+import asyncio
+import secrets
+
+from aiohttp import BasicAuth, ClientTimeout
+
+from config import Config
+from bot.logger import LOGGER
+
+from .error import RcloneError
+from .http_pool import http_pool
+
+
+RCLONE_CONFIG = './rclone.conf'
+
+
+class Rclone:
+    """
+    rclone backend.
+    One `rclone rcd` is started at boot and every copy/link goes through its
+    remote control API, so a remote is initialised once instead of once per
+    spawned process. Falls back to the rclone CLI if the daemon is not running.
+    """
+    def __init__(self):
+        self.settings = Config.RCLONE_RCD
+        self.process = None
+        self.available = False
+        self._auth = BasicAuth('siesta', secrets.token_urlsafe(16))
+        self._semaphore = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.settings['ADDR']}/"
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # limits concurrent transfers started through the daemon
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.settings['CONCURRENCY'])
+        return self._semaphore
+
+    async def start(self):
+        """Start the rclone daemon (no-op if disabled or rclone is missing)"""
+        if not self.settings['ENABLED'] or not shutil.which('rclone'):
+            return
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                'rclone', 'rcd',
+                '--config', RCLONE_CONFIG,
+                '--rc-addr', self.settings['ADDR'],
+                '--rc-user', self._auth.login,
+                '--rc-pass', self._auth.password,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+        except OSError as e:
+            return LOGGER.warning(f"RCLONE : Daemon could not be started - {e}")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.settings['START_TIMEOUT']
+        while loop.time() < deadline and self.process.returncode is None:
+            try:
+                await self.call('rc/noop')
+                self.available = True
+                return LOGGER.info(f"RCLONE : Daemon running on {self.settings['ADDR']}")
+            except Exception:
+                await asyncio.sleep(0.5)
+        LOGGER.warning("RCLONE : Daemon not reachable, using rclone CLI")
+        await self.stop()
+
+    async def stop(self):
+        self.available = False
+        if self.process is not None and self.process.returncode is None:
+            self.process.terminate()
+            await self.process.wait()
+        self.process = None
+
+    async def call(self, command:str, **params) -> dict:
+        """
+        Args:
+            command: rc command (eg: operations/copyfile)
+            params: command parameters
+        Returns:
+            dict: response of the daemon
+        """
+        async with http_pool.session.post(
+            self.url + command,
+            json=params,
+            auth=self._auth,
+            timeout=ClientTimeout(total=60)
+        ) as response:
+            data = await response.json(content_type=None)
+            if response.status != 200:
+                raise RcloneError(f"{command} : {data.get('error', response.status)}")
+            return data
+
+    async def run_job(self, command:str, **params) -> dict:
+        """Run a command as an async job and wait for it to finish"""
+        job = await self.call(command, _async=True, **params)
+        while True:
+            await asyncio.sleep(self.settings['POLL_INTERVAL'])
+            status = await self.call('job/status', jobid=job['jobid'])
+            if status['finished']:
+                if not status['success']:
+                    raise RcloneError(f"{command} : {status['error']}")
+                return status.get('output') or {}
+
+    @staticmethod
+    def dest(remote:str='') -> str:
+        """RCLONE_DEST joined with a relative path"""
+        base = Config.RCLONE_DEST
+        if not remote:
+            return base
+        sep = '' if base.endswith((':', '/')) else '/'
+        return f"{base}{sep}{remote}"
+
+    async def copyfile(self, path:str, remote:str):
+        """
+        Args:
+            path: local file
+            remote: destination path relative to RCLONE_DEST
+        """
+        path = os.path.abspath(path)
+        async with self.semaphore:
+            await self.run_job(
+                'operations/copyfile',
+                srcFs=os.path.dirname(path),
+                srcRemote=os.path.basename(path),
+                dstFs=Config.RCLONE_DEST,
+                dstRemote=remote
+            )
+
+    async def copydir(self, path:str, remote:str):
+        async with self.semaphore:
+            await self.run_job(
+                'sync/copy',
+                srcFs=os.path.abspath(path),
+                dstFs=self.dest(remote)
+            )
+
+    async def copy(self, paths:list, basepath:str):
+        """
+        Upload files/folders keeping their path relative to basepath
+        Args:
+            paths: local files or folders inside basepath
+            basepath: local folder mapped to RCLONE_DEST (DOWNLOADS/r_id/)
+        Raises:
+            RcloneError: if any of the transfers failed
+        """
+        if not self.available:
+            return await self._cli_copy(basepath)
+
+        tasks = []
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            remote = os.path.relpath(path, basepath)
+            if os.path.isdir(path):
+                tasks.append(self.copydir(path, '' if remote == '.' else remote))
+            else:
+                tasks.append(self.copyfile(path, remote))
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        for error in errors:
+            LOGGER.error(f"RCLONE : {error}")
+        if errors:
+            raise RcloneError(f"{len(errors)} of {len(tasks)} transfers failed - {errors[0]}")
+
+    async def link(self, remote:str) -> str | None:
+        """
+        Args:
+            remote: path relative to RCLONE_DEST
+        Returns:
+            public link or None
+        """
+        if not self.available:
+            return await self._cli_link(remote)
+        try:
+            data = await self.call('operations/publiclink', fs=Config.RCLONE_DEST, remote=remote)
+            return data.get('url')
+        except Exception as e:
+            LOGGER.debug(f"Failed to get link: {e}")
+            return None
+
+    async def rcat(self, stream, remote:str):
+        """
+        Upload a file object (eg: ZipStream) without it existing on disk
+        Args:
+            stream: readable file object with a size attribute
+            remote: destination path relative to RCLONE_DEST
+        """
+        task = await asyncio.create_subprocess_exec(
+            'rclone', 'rcat',
+            '--config', RCLONE_CONFIG,
+            '--size', str(stream.size),
+            self.dest(remote),
+            stdin=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            while chunk := await asyncio.to_thread(stream.read, Config.PERFORMANCE['CHUNK_SIZE']):
+                task.stdin.write(chunk)
+                await task.stdin.drain()
+            task.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except BaseException:
+            # stream failed (eg: ZipStreamError), never let rclone finish a short file
+            task.kill()
+            await task.wait()
+            raise
+        _, stderr = await task.communicate()
+        if task.returncode != 0:
+            raise RcloneError(f"rcat : {stderr.decode().strip()}")
+
+    async def _cli_copy(self, basepath):
+        cmd = f'rclone copy --config {RCLONE_CONFIG} "{basepath}" "{Config.RCLONE_DEST}"'
+        task = await asyncio.create_subprocess_shell(cmd)
+        if await task.wait() != 0:
+            raise RcloneError(f"copy : rclone exited with {task.returncode}")
+
+    async def _cli_link(self, remote):
+        cmd = f'rclone link --config {RCLONE_CONFIG} "{self.dest(remote)}"'
+        task = await asyncio.create_subprocess_shell(
+            cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+
+        stdout, stderr = await task.communicate()
+
+        if task.returncode == 0:
+            return stdout.decode().strip()
+        LOGGER.debug(f"Failed to get link: {stderr.decode().strip()}")
+        return None
+
+
+rclone = Rclone()
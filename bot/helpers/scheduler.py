@@ -0,0 +1,143 @@
+import asyncio
+import itertools
+
+from collections import deque
+from contextlib import asynccontextmanager
+
+from config import Config
+from bot.settings import bot_set
+
+
+# no owner can take a slot (owner keys may be None)
+NOBODY = object()
+
+
+class DownloadScheduler:
+    """
+    Process wide budget of download slots shared by every job.
+    Waiting downloads are queued per owner (user, or chat with CHAT+ anti
+    spam) and a freed slot goes to the owner with the lowest active/weight
+    share, oldest request first on ties, so a big job cannot starve the
+    others and admins get ADMIN_WEIGHT times the share of a user. One owner
+    never holds more than PER_OWNER slots.
+    """
+    def __init__(self):
+        self.active = {} # owner -> slots held
+        self.waiting = {} # owner -> deque of (seq, future)
+        self.weights = {}
+        self.used = 0
+        self._seq = itertools.count()
+        self._stats = {'granted': 0, 'queued': 0}
+
+    @property
+    def settings(self) -> dict:
+        return Config.PERFORMANCE['DOWNLOAD_SCHEDULER']
+
+    def owner(self, user:dict | None) -> tuple:
+        """
+        Returns:
+            (owner key, weight) of the user details
+        """
+        if not user:
+            return None, 1
+        key = user['chat_id'] if bot_set.anti_spam == 'CHAT+' else user['user_id']
+        weight = self.settings['ADMIN_WEIGHT'] if user['user_id'] in bot_set.admins else 1
+        return key, weight
+
+    @asynccontextmanager
+    async def slot(self, owner=None, weight=1):
+        await self.acquire(owner, weight)
+        try:
+            yield
+        finally:
+            self.release(owner)
+
+    async def run(self, task, user:dict | None = None):
+        """Await task (coroutine) inside a slot of the user"""
+        async with self.slot(*self.owner(user)):
+            return await task
+
+    async def acquire(self, owner=None, weight=1):
+        future = asyncio.get_running_loop().create_future()
+        self.weights[owner] = weight
+        self.waiting.setdefault(owner, deque()).append((next(self._seq), future))
+        self._dispatch()
+        if not future.done():
+            self._stats['queued'] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # granted while being cancelled
+                self.release(owner)
+            raise
+
+    def release(self, owner=None):
+        self.active[owner] -= 1
+        if not self.active[owner]:
+            del self.active[owner]
+        self.used -= 1
+        if owner not in self.active and owner not in self.waiting:
+            self.weights.pop(owner, None)
+        self._dispatch()
+
+    def _next_owner(self):
+        best, best_rank = NOBODY, None
+        for owner, queue in self.waiting.items():
+            active = self.active.get(owner, 0)
+            if active >= self.settings['PER_OWNER']:
+                continue
+            rank = (active / self.weights.get(owner, 1), queue[0][0])
+            if best_rank is None or rank < best_rank:
+                best, best_rank = owner, rank
+        return best
+
+    def _dispatch(self):
+        # drop waiters cancelled before their turn
+        for owner in list(self.waiting):
+            queue = self.waiting[owner]
+            while queue and queue[0][1].done():
+                queue.popleft()
+            if not queue:
+                del self.waiting[owner]
+                if owner not in self.active:
+                    self.weights.pop(owner, None)
+
+        while self.used < self.settings['SLOTS']:
+            owner = self._next_owner()
+            if owner is NOBODY:
+                break
+            queue = self.waiting[owner]
+            _, future = queue.popleft()
+            if not queue:
+                del self.waiting[owner]
+            if future.done():
+                continue
+            self.active[owner] = self.active.get(owner, 0) + 1
+            self.used += 1
+            self._stats['granted'] += 1
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            live slot usage and per owner active/waiting counts
+        """
+        owners = set(self.active) | set(self.waiting)
+        return {
+            'slots': self.settings['SLOTS'],
+            'used': self.used,
+            'waiting': sum(len(queue) for queue in self.waiting.values()),
+            'owners': {
+                owner: {
+                    'active': self.active.get(owner, 0),
+                    'waiting': len(self.waiting.get(owner, ())),
+                    'weight': self.weights.get(owner, 1)
+                }
+                for owner in owners
+            },
+            **self._stats
+        }
+
+
+download_scheduler = DownloadScheduler()
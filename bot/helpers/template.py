@@ -0,0 +1,96 @@
+import re
+
+from functools import lru_cache
+
+from config import Config
+from .translations import lang_available
+
+
+PLACEHOLDER = re.compile(r'\{(\w+)\}')
+
+# placeholder -> value from (metadata, user)
+FIELDS = {
+    'title': lambda data, user: data['title'],
+    'album': lambda data, user: data['album'],
+    'artist': lambda data, user: data['artist'],
+    'albumartist': lambda data, user: data['albumartist'],
+    'tracknumber': lambda data, user: data['tracknumber'],
+    'date': lambda data, user: data['date'],
+    'upc': lambda data, user: data['upc'],
+    'isrc': lambda data, user: data['isrc'],
+    'totaltracks': lambda data, user: data['totaltracks'],
+    'volume': lambda data, user: data['volume'],
+    'totalvolume': lambda data, user: data['totalvolume'],
+    'extension': lambda data, user: data['extension'],
+    'duration': lambda data, user: data['duration'],
+    'copyright': lambda data, user: data['copyright'],
+    'genre': lambda data, user: data['genre'],
+    'provider': lambda data, user: data['provider'].title(),
+    'quality': lambda data, user: data['quality'],
+    'explicit': lambda data, user: data['explicit'],
+    'user': lambda data, user: user['name'],
+    'username': lambda data, user: user['user_name'],
+}
+USER_FIELDS = ('user', 'username')
+
+# templates checked when the bot starts
+LANG_TEMPLATES = ('ALBUM_TEMPLATE', 'PLAYLIST_TEMPLATE', 'ARTIST_TEMPLATE')
+
+
+@lru_cache(maxsize=128)
+def compile_template(text:str):
+    """
+    Parse a template once into literal text and placeholder getters
+    Args:
+        text: template (eg: '{title} - {artist}')
+    Returns:
+        tuple of str (literal) / (name, getter) parts
+    """
+    parts = []
+    pos = 0
+    for match in PLACEHOLDER.finditer(text):
+        name = match.group(1)
+        if name not in FIELDS:
+            raise ValueError(f"Unknown placeholder {{{name}}} in template {text!r}")
+        if match.start() > pos:
+            parts.append(text[pos:match.start()])
+        parts.append((name, FIELDS[name]))
+        pos = match.end()
+    if pos < len(text):
+        parts.append(text[pos:])
+    return tuple(parts)
+
+
+def format_text(text:str, data, user=None) -> str:
+    """
+    Sync single pass formatting of a template
+    Args:
+        text: template
+        data: metadata (dict or Meta)
+        user: user details ({user}/{username} stay as is without it)
+    Returns:
+        str
+    """
+    out = []
+    for part in compile_template(text):
+        if type(part) is str:
+            out.append(part)
+        elif user is None and part[0] in USER_FIELDS:
+            out.append(f"{{{part[0]}}}")
+        else:
+            out.append(str(part[1](data, user)))
+    return ''.join(out)
+
+
+def validate_templates():
+    """Raise ValueError if a configured or language template has an unknown placeholder"""
+    compile_template(Config.TRACK_NAME_FORMAT)
+    compile_template(Config.PLAYLIST_NAME_FORMAT)
+    for lang in lang_available:
+        for name in LANG_TEMPLATES:
+            template = getattr(lang, name, None)
+            if template:
+                compile_template(template)
+
+
+validate_templates()
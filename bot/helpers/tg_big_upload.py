@@ -0,0 +1,161 @@
+import os
+import math
+import asyncio
+
+from pyrogram import raw
+from pyrogram.errors import FloodWait
+from pyrogram.session import Session
+
+from config import Config
+from bot.tgclient import aio
+from bot.logger import LOGGER
+
+from .error import UploadError
+from .message import send_message, send_uploaded
+from .zipper.stream import ZipStream
+
+
+PART_SIZE = 512 * 1024  # max part size of upload.saveBigFilePart
+BIG_FILE = 10 * 1024 * 1024  # telegram needs the big file api above this
+PART_RETRIES = 5
+WORKERS_PER_SESSION = 2  # requests in flight per connection
+
+
+def _source(item) -> tuple:
+    """
+    Returns:
+        (name, size) of a file path or ZipStream
+    """
+    if isinstance(item, ZipStream):
+        return item.name, item.size
+    return os.path.basename(item), os.path.getsize(item)
+
+
+def _read_part(f) -> bytes:
+    # ZipStream reads may return less than asked, parts must be full size
+    data = bytearray()
+    while len(data) < PART_SIZE:
+        chunk = f.read(PART_SIZE - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return bytes(data)
+
+
+class BigUpload:
+    """
+    Upload of one big document over several MTProto media sessions.
+    Parts are read sequentially (so ZipStreams work too) and saved by
+    concurrent workers; a failed part is retried on its own without
+    restarting the file. Progress is reported per saved part.
+    Args:
+        item: file path or ZipStream
+        progress: async callback(done_bytes, total_bytes)
+    """
+    def __init__(self, item, progress=None):
+        self.item = item
+        self.name, self.size = _source(item)
+        self.parts = math.ceil(self.size / PART_SIZE)
+        self.file_id = aio.rnd_id()
+        self.progress = progress
+        self.done = 0
+
+    async def upload(self) -> raw.types.InputFileBig:
+        count = max(1, Config.PERFORMANCE['TG_UPLOAD_SESSIONS'])
+        dc_id, auth_key, test_mode = await aio.storage.dc_id(), await aio.storage.auth_key(), await aio.storage.test_mode()
+        sessions = [Session(aio, dc_id, auth_key, test_mode, is_media=True) for _ in range(count)]
+        queue = asyncio.Queue(maxsize=count * WORKERS_PER_SESSION)
+        try:
+            await asyncio.gather(*(session.start() for session in sessions))
+            workers = [
+                asyncio.create_task(self._worker(session, queue))
+                for session in sessions for _ in range(WORKERS_PER_SESSION)
+            ]
+            reader = asyncio.create_task(self._reader(queue, len(workers)))
+            try:
+                await asyncio.gather(reader, *workers)
+            except BaseException:
+                for task in (reader, *workers):
+                    task.cancel()
+                await asyncio.gather(reader, *workers, return_exceptions=True)
+                raise
+        finally:
+            await asyncio.gather(*(session.stop() for session in sessions), return_exceptions=True)
+        return raw.types.InputFileBig(id=self.file_id, parts=self.parts, name=self.name)
+
+    async def _reader(self, queue:asyncio.Queue, workers:int):
+        if isinstance(self.item, ZipStream):
+            f = self.item
+            f.seek(0)
+        else:
+            f = open(self.item, 'rb')
+        try:
+            for index in range(self.parts):
+                data = await asyncio.to_thread(_read_part, f)
+                await queue.put((index, data))
+        finally:
+            if f is not self.item:
+                f.close()
+        for _ in range(workers):
+            await queue.put(None)
+
+    async def _worker(self, session:Session, queue:asyncio.Queue):
+        while (part := await queue.get()) is not None:
+            index, data = part
+            await self._save_part(session, index, data)
+            self.done += len(data)
+            if self.progress:
+                await self.progress(self.done, self.size)
+
+    async def _save_part(self, session:Session, index:int, data:bytes):
+        for attempt in range(PART_RETRIES):
+            try:
+                saved = await session.invoke(
+                    raw.functions.upload.SaveBigFilePart(
+                        file_id=self.file_id,
+                        file_part=index,
+                        file_total_parts=self.parts,
+                        bytes=data
+                    )
+                )
+                if saved:
+                    return
+            except FloodWait as e:
+                await asyncio.sleep(e.value)
+                continue
+            except Exception as e:
+                LOGGER.debug(f"UPLOAD : Part {index} of {self.name} failed - {e}")
+            await asyncio.sleep(2 ** attempt)
+        raise UploadError(f"Part {index} of {self.name} failed after {PART_RETRIES} attempts")
+
+
+async def send_document(user:dict, item, caption=None, progress=None):
+    """
+    Send a document, big ones (zip parts) through BigUpload
+    Args:
+        user: user details
+        item: file path or ZipStream
+        caption: text
+        progress: async callback(done_bytes, total_bytes)
+    Returns:
+        sent message
+    """
+    name, size = _source(item)
+    if isinstance(item, ZipStream) and size <= BIG_FILE:
+        # read by pyrogram, which would not report a size mismatch
+        item = await asyncio.to_thread(item.save)
+    if size > BIG_FILE:
+        try:
+            file = await BigUpload(item, progress).upload()
+            media = raw.types.InputMediaUploadedDocument(
+                mime_type=aio.guess_mime_type(name) or 'application/zip',
+                file=file,
+                attributes=[raw.types.DocumentAttributeFilename(file_name=name)]
+            )
+            return await send_uploaded(user, media, caption)
+        except Exception as e:
+            LOGGER.error(f"UPLOAD : Parallel upload of {name} failed, using single connection - {e}")
+            if isinstance(item, ZipStream):
+                # a stream may not match its size (ZipStreamError), send the zip from disk
+                item = await asyncio.to_thread(item.save)
+    return await send_message(user, item, 'doc', caption=caption)
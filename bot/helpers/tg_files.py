@@ -0,0 +1,83 @@
+from config import Config
+from bot.logger import LOGGER
+
+from .database.pg_impl import file_db
+from .message import send_message
+
+
+# file_ids are bound to the bot account that uploaded them
+BOT_ID = Config.TG_BOT_TOKEN.split(':')[0]
+
+
+def media_key(provider, item_id, *quality) -> tuple:
+    """
+    Returns:
+        (provider, item id, quality) identifying a sent media
+    """
+    return provider.lower(), str(item_id), ':'.join(str(i) for i in quality)
+
+
+def get_file_ids(key:tuple, kind:str) -> list | None:
+    """
+    Args:
+        key: media_key()
+        kind: audio|zip|poster
+    """
+    try:
+        return file_db.get_file_ids(*key, kind, BOT_ID)
+    except Exception as e:
+        LOGGER.error(f"FILE ID : Lookup failed - {e}")
+        return None
+
+
+def save_file_ids(key:tuple, kind:str, msgs:list):
+    file_ids = []
+    for msg in msgs:
+        media = msg and (msg.audio or msg.document or msg.photo)
+        if media is None:
+            return
+        file_ids.append(media.file_id)
+    if not file_ids:
+        return
+    try:
+        file_db.set_file_ids(*key, kind, BOT_ID, file_ids)
+    except Exception as e:
+        LOGGER.error(f"FILE ID : Saving failed - {e}")
+
+
+def delete_file_ids(key:tuple, kind:str):
+    try:
+        file_db.delete_file_ids(*key, kind, BOT_ID)
+    except Exception as e:
+        LOGGER.error(f"FILE ID : Deleting failed - {e}")
+
+
+async def send_cached(user:dict, key:tuple, kind:str, itype:str, caption=None, meta=None) -> list | None:
+    """
+    Resend a media by its cached file_id (no download/upload needed)
+    Args:
+        user: user details
+        key: media_key()
+        kind: audio|zip|poster
+        itype: itype for send_message
+    Returns:
+        list of sent messages, None if not cached or the file_id is no longer valid
+    """
+    file_ids = get_file_ids(key, kind)
+    if not file_ids:
+        return None
+
+    msgs = []
+    try:
+        for file_id in file_ids:
+            msgs.append(await send_message(user, file_id, itype, caption, meta=meta))
+    except Exception as e:
+        LOGGER.info(f"FILE ID : Cached {kind} of {key} not usable - {e}")
+        delete_file_ids(key, kind)
+        # partially sent multi part item, the caller sends everything again
+        for msg in msgs:
+            await msg.delete()
+            if user.get('job'):
+                user['job'].messages.remove(msg)
+        return None
+    return msgs
@@ -0,0 +1,144 @@
+import os
+import asyncio
+
+from pyrogram import raw
+
+from config import Config
+from bot.logger import LOGGER
+
+from .message import upload_audio, send_uploaded, group_media, send_uploaded_group
+from .tg_files import get_file_ids, save_file_ids, send_cached
+from .scheduler import download_scheduler
+
+
+# track already sent once, posted again by file_id
+CACHED = object()
+MEDIA_GROUP_SIZE = 10
+
+
+class TelegramUploader:
+    """
+    Uploads the tracks of a collection in parallel and posts them in order.
+    A track is uploaded (save_file) as soon as its download finishes, with at
+    most TG_UPLOAD_WORKERS uploads running across all jobs. One poster task
+    per job sends the uploaded media in track order, so a FloodWait only
+    holds back the messages of that chat.
+    With TG_MEDIA_GROUP, consecutive tracks are sent as media groups of up
+    to 10; members that cannot be grouped are sent on their own.
+    Args:
+        user: user details
+        tracks: track metadata in posting order
+    """
+    _semaphore = None
+
+    def __init__(self, user:dict, tracks:list):
+        self.user = user
+        self.tracks = list(tracks)
+        self.grouped = Config.TG_MEDIA_GROUP
+        loop = asyncio.get_running_loop()
+        self._slots = {id(track): loop.create_future() for track in self.tracks}
+        self._fetch = {} # id(track) -> download of a cached track if its file_id is stale
+        self._poster = asyncio.create_task(self._post())
+
+    @classmethod
+    def semaphore(cls) -> asyncio.Semaphore:
+        if cls._semaphore is None:
+            cls._semaphore = asyncio.Semaphore(Config.PERFORMANCE['TG_UPLOAD_WORKERS'])
+        return cls._semaphore
+
+    async def track(self, task, track_meta):
+        """
+        Wrap a start_track() coroutine so its file is uploaded as soon as it is done
+        """
+        try:
+            return await task
+        finally:
+            self.ready(track_meta)
+
+    def cached(self, track_meta, fetch):
+        """
+        Resend a track by file_id in its turn without downloading it
+        Args:
+            fetch: coroutine function downloading the track (start_track),
+                only run if the cached file_id turns out to be stale
+        """
+        self._fetch[id(track_meta)] = fetch
+        self.ready(track_meta)
+
+    def ready(self, track_meta):
+        """Start uploading a track (downloaded, failed or cached)"""
+        slot = self._slots[id(track_meta)]
+        if not slot.done():
+            slot.set_result(asyncio.create_task(self._upload(track_meta)))
+
+    async def _upload(self, track, use_cache=True):
+        if use_cache and track['media_key'] and get_file_ids(track['media_key'], 'audio'):
+            return CACHED
+        if not track['filepath'] or not os.path.isfile(track['filepath']):
+            # download failed, the error was already sent
+            return None
+        async with self.semaphore():
+            media = await upload_audio(track['filepath'], track)
+            if self.grouped and os.path.getsize(track['filepath']) <= Config.ZIP_SETTINGS['TELEGRAM_LIMIT']:
+                try:
+                    media = await group_media(self.user, media)
+                except Exception as e:
+                    LOGGER.debug(f"UPLOADER : {track['title']} sent without group - {e}")
+            return media
+
+    async def _post(self):
+        group = []
+        for track in self.tracks:
+            upload = await self._slots[id(track)]
+            try:
+                media = await upload
+                if media is CACHED:
+                    await self._flush(group)
+                    if await send_cached(self.user, track['media_key'], 'audio', 'audio', meta=track):
+                        continue
+                    fetch = self._fetch.pop(id(track), None)
+                    if fetch:
+                        # stale file_id, the track was never downloaded
+                        await download_scheduler.run(fetch(), self.user)
+                    media = await self._upload(track, False)
+                if media is None:
+                    continue
+                if isinstance(media, raw.types.InputMediaDocument):
+                    group.append((track, media))
+                    if len(group) == MEDIA_GROUP_SIZE:
+                        await self._flush(group)
+                else:
+                    await self._flush(group)
+                    await self._send(track, media)
+            except Exception as e:
+                LOGGER.error(f"UPLOADER : Failed to upload {track['title']} - {e}")
+        await self._flush(group)
+
+    async def _send(self, track, media):
+        msg = await send_uploaded(self.user, media)
+        if track['media_key']:
+            save_file_ids(track['media_key'], 'audio', [msg])
+
+    async def _flush(self, group:list):
+        """Send the collected group members (emptied afterwards)"""
+        members, group[:] = group[:], []
+        if len(members) > 1:
+            try:
+                msgs = await send_uploaded_group(self.user, [(media, None) for _, media in members])
+                for (track, _), msg in zip(members, msgs):
+                    if track['media_key']:
+                        save_file_ids(track['media_key'], 'audio', [msg])
+                return
+            except Exception as e:
+                LOGGER.info(f"UPLOADER : Media group failed, sending one by one - {e}")
+        for track, media in members:
+            try:
+                await self._send(track, media)
+            except Exception as e:
+                LOGGER.error(f"UPLOADER : Failed to upload {track['title']} - {e}")
+
+    async def finish(self):
+        """Upload the tracks not fed yet and wait until everything is posted"""
+        for track in self.tracks:
+            self.ready(track)
+        await self._poster
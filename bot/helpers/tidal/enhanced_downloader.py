@@ -1,6 +1,4 @@
 import asyncio
-import aiohttp
-import aiofiles
 import os
 import time
 from typing import List, Optional
@@ -8,7 +6,9 @@ from pathlib import Path
 from bot.config import Config
 from bot.logger import LOGGER
 from bot.helpers.cache import CacheManager
+from bot.helpers.downloader import fetch_file, discard_partial
 from bot.helpers.rate_limiter import RateLimiter
+from bot.helpers.scheduler import download_scheduler
 from bot.helpers.utils import format_size, format_time, format_string
 from bot.helpers.tidal.tidal_api import tidalapi
 from bot.helpers.translations import lang
@@ -22,9 +22,6 @@ class EnhancedDownloader:
             window=Config.SECURITY['RATE_LIMIT']['WINDOW'],
             burst=Config.SECURITY['RATE_LIMIT']['BURST']
         )
-        self._download_semaphore = asyncio.Semaphore(
-            Config.PERFORMANCE['MAX_CONCURRENT_DOWNLOADS']
-        )
         self._progress_callback = None
         self._memory_pool = []
         self._max_memory = Config.PERFORMANCE['MEMORY_LIMIT']
@@ -71,15 +68,19 @@ class EnhancedDownloader:
         track_id: int,
         output_dir: str,
         quality: str = None,
-        message = None
+        message = None,
+        user: dict = None
     ) -> Optional[str]:
-        """Download track with retries and error handling"""
+        """Download track with retries (resumed from the .part file) and error handling
+        user: user details owning the download slot (see DownloadScheduler.owner)"""
+        filepath = None
         for attempt in range(Config.MAX_RETRIES):
             try:
                 # Rate limiting
                 await self.rate_limiter.wait()
 
-                async with self._download_semaphore:
+                # slot of the process wide download budget
+                async with download_scheduler.slot(*download_scheduler.owner(user)):
                     # Get track metadata with caching
                     track_data = await self._get_track_metadata(track_id)
                     if not track_data:
@@ -99,42 +100,21 @@ class EnhancedDownloader:
                     filepath = os.path.join(output_dir, filename)
 
                     # Download with progress
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(stream_data['url']) as response:
-                            if not response.ok:
-                                raise aiohttp.ClientError(
-                                    f"Download failed with status {response.status}"
-                                )
-
-                            total_size = int(response.headers.get('content-length', 0))
-                            if total_size > Config.SECURITY['MAX_FILE_SIZE']:
-                                raise ValueError(f"File size exceeds limit: {format_size(total_size)}")
-
-                            current_size = 0
-                            self._start_time = time.time()
-                            self._last_progress_update = 0
-
-                            async with aiofiles.open(filepath, 'wb') as f:
-                                async for chunk in response.content.iter_chunked(Config.PERFORMANCE['CHUNK_SIZE']):
-                                    if not chunk:
-                                        break
-
-                                    if not await self._check_memory(len(chunk)):
-                                        await self._clear_memory()
-
-                                    await f.write(chunk)
-                                    current_size += len(chunk)
-                                    self._memory_pool.append(chunk)
-
-                                    if message:
-                                        await self._report_progress(
-                                            current_size,
-                                            total_size,
-                                            message
-                                        )
-
-                            # Clear memory after download
-                            await self._clear_memory()
+                    self._start_time = time.time()
+                    self._last_progress_update = 0
+
+                    async def progress(current_size, total_size):
+                        if message and total_size:
+                            await self._report_progress(current_size, total_size, message)
+
+                    await fetch_file(
+                        stream_data['url'],
+                        filepath,
+                        Config.TIMEOUT,
+                        segmented=True,
+                        progress=progress,
+                        max_size=Config.SECURITY['MAX_FILE_SIZE']
+                    )
 
                     return filepath
 
@@ -143,8 +123,10 @@ class EnhancedDownloader:
                 if attempt < Config.MAX_RETRIES - 1:
                     await asyncio.sleep(Config.RETRY_DELAY * (attempt + 1))
                 else:
-                    if os.path.exists(filepath):
-                        os.remove(filepath)
+                    if filepath:
+                        discard_partial(filepath)
+                        if os.path.exists(filepath):
+                            os.remove(filepath)
                     raise
 
     async def download_album(
@@ -152,7 +134,8 @@ class EnhancedDownloader:
         album_id: int,
         user_id: str,
         zip_enabled: bool = True,
-        message = None
+        message = None,
+        user: dict = None
     ) -> List[str]:
         """Download full album with optional ZIP"""
         try:
@@ -185,7 +168,8 @@ class EnhancedDownloader:
                     track['id'],
                     album_folder,
                     self.config['QUALITY'],
-                    message
+                    message,
+                    user
                 )
                 download_tasks.append(task)
 
@@ -271,7 +255,8 @@ class EnhancedDownloader:
         playlist_id: int,
         user_id: str,
         zip_enabled: bool = True,
-        message = None
+        message = None,
+        user: dict = None
     ) -> List[str]:
         """Download playlist with optional ZIP"""
         try:
@@ -304,7 +289,8 @@ class EnhancedDownloader:
                     track['id'],
                     playlist_folder,
                     self.config['QUALITY'],
-                    message
+                    message,
+                    user
                 )
                 download_tasks.append(task)
 
@@ -374,7 +360,8 @@ class EnhancedDownloader:
         artist_id: int,
         user_id: str,
         zip_enabled: bool = True,
-        message = None
+        message = None,
+        user: dict = None
     ) -> List[str]:
         """Download artist's albums with optional ZIP"""
         try:
@@ -408,7 +395,8 @@ class EnhancedDownloader:
                         album['id'],
                         user_id,
                         zip_enabled=False,  # Don't zip individual albums
-                        message=message
+                        message=message,
+                        user=user
                     )
                     all_files.extend(album_files)
                 except Exception as e:
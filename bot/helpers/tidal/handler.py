@@ -8,7 +8,12 @@ from .utils import *
 from .metadata import *
 
 from ..utils import *
-from ..metadata import set_metadata, get_audio_extension
+from ..metadata import set_metadata, tag_reserve
+from ..disk_cache import track_cache
+from ..tg_files import media_key, get_file_ids, send_cached
+from ..zipper.incremental import incremental_zipper
+from ..tg_uploader import TelegramUploader
+from ..progress import JobProgress
 from ..uploder import *
 from ..message import send_message
 
@@ -49,6 +54,26 @@ async def start_track(track_id:int, user:dict, track_meta:dict | None, \
     else:
         filepath = basefolder
 
+    track_meta['media_key'] = media_key(track_meta['provider'], track_id, session_label(session), quality, Config.TIDAL_SETTINGS['CONVERT_M4A'])
+    if upload and bot_set.upload_mode == 'Telegram':
+        # already uploaded once, resend by file_id
+        if await send_cached(user, track_meta['media_key'], 'audio', 'audio', meta=track_meta):
+            return True
+
+    cache_key = track_cache.key(track_meta['provider'], track_id, session_label(session), quality, Config.TIDAL_SETTINGS['CONVERT_M4A'])
+    cached = track_cache.get(cache_key)
+    if cached:
+        track_meta['quality'] = cached['quality']
+        track_meta['folderpath'] = filepath
+        filename = format_text(Config.TRACK_NAME_FORMAT, track_meta, user)
+        track_meta['extension'] = cached['extension']
+        track_meta['filepath'] = sanitize_filepath(f"{filepath}/{filename}") + f".{cached['extension']}"
+        await track_cache.fetch(cached, track_meta['filepath'])
+
+        if upload:
+            await track_upload(track_meta, user, False)
+        return True
+
     try:
         stream_data = await tidalapi.get_stream_url(track_id, quality, session)
     except Exception as e:
@@ -74,7 +99,7 @@ async def start_track(track_id:int, user:dict, track_meta:dict | None, \
 
         
         track_meta['folderpath'] = filepath
-        filename = await format_string(Config.TRACK_NAME_FORMAT, track_meta, user)
+        filename = format_text(Config.TRACK_NAME_FORMAT, track_meta, user)
         # not adding file extention now
         filepath += f"/{filename}"
         filepath = sanitize_filepath(filepath)
@@ -82,33 +107,34 @@ async def start_track(track_id:int, user:dict, track_meta:dict | None, \
 
 
         if type(urls) == list:
-            i = 0   # flawless
-            temp_files = []
-            for url in urls[0]:
-                temp_path = f"{filepath}.{i}"
-                err = await download_file(url, temp_path)
-                if err:
-                    return await send_message(user, err)
-                i+=1
-                temp_files.append(temp_path)
-            await merge_tracks(temp_files, filepath)
+            err = await download_segments(urls[0], filepath, progress=user.get('progress'))
+            if err:
+                return await send_message(user, err)
         else:
-            err = await download_file(urls, filepath)
+            reserve = tag_reserve(track_meta) if track_codec == 'FLAC' else 0
+            err = await download_file(urls, filepath, segmented=True, reserve=reserve, progress=user.get('progress'))
             if err:
                 return await send_message(user, err)
 
-        track_meta['extension'] = await get_audio_extension(filepath)
-        
-        if quality == 'HI_RES_LOSSLESS' and Config.TIDAL_CONVERT_M4A:
+        if quality == 'HI_RES_LOSSLESS' and Config.TIDAL_SETTINGS['CONVERT_M4A']:
             await ffmpeg_convert(filepath)
             track_meta['filepath'] = track_meta['filepath'] + '.flac'
+            track_meta['extension'] = 'flac'
             os.remove(filepath)
+            await set_metadata(track_meta)
         else:
+            # tagged before the rename, the same parse gives the extension
+            track_meta['extension'] = await set_metadata(track_meta)
             track_meta['filepath'] = track_meta['filepath'] + f".{track_meta['extension']}"
             # local filepath var is not updated so it contains old path before extention update
             os.rename(filepath, track_meta['filepath'])
 
-        await set_metadata(track_meta)
+        await track_cache.put(
+            cache_key,
+            track_meta['filepath'],
+            extension=track_meta['extension'],
+            quality=track_meta['quality']
+        )
 
         if upload:
             await track_upload(track_meta, user, False)
@@ -117,7 +143,7 @@ async def start_track(track_id:int, user:dict, track_meta:dict | None, \
 
         
 
-async def start_album(album_id:int, user:dict, upload=True, basefolder=None):
+async def start_album(album_id:int, user:dict, upload=True, basefolder=None, zipper=None):
     try:
         album_data = await tidalapi.get_album(album_id)
     except Exception as e:
@@ -142,31 +168,62 @@ async def start_album(album_id:int, user:dict, upload=True, basefolder=None):
     stream_data = await tidalapi.get_stream_url(track_id, quality, session)
 
     album_meta['quality'] = await get_quality(stream_data)
+    album_meta['media_key'] = media_key(album_meta['provider'], album_id, session_label(session), quality, Config.TIDAL_SETTINGS['CONVERT_M4A'])
 
     if upload:
         album_meta['poster_msg'] = await post_art_poster(user, album_meta)
 
-    # concurrent
-    tasks = []
-    for track in album_meta['tracks']:
-        tasks.append(start_track(track['itemid'], user, track, False, album_folder, session, quality))
-
-    update_details = {
-        'text': lang.s.DOWNLOAD_PROGRESS,
-        'msg': user['bot_msg'],
-        'title': album_meta['title'],
-        'type': album_meta['type']
-    }
-    await run_concurrent_tasks(tasks, update_details)
+    telegram = upload and bot_set.upload_mode == 'Telegram'
+    if telegram and bot_set.album_zip:
+        if await send_cached(user, album_meta['media_key'], 'zip', 'doc', await create_simple_text(album_meta, user)):
+            return
 
+    # zipper passed by artist when the whole artist is zipped
+    own_zipper = None
     if bot_set.album_zip:
-        await edit_message(user['bot_msg'], lang.s.ZIPPING)
-        album_meta['folderpath'] = await zip_handler(album_meta['folderpath'])
+        zipper = own_zipper = incremental_zipper(album_folder)
 
-    # Upload
-    if upload:
-        await edit_message(user['bot_msg'], lang.s.UPLOADING)
-        await album_upload(album_meta, user)
+    try:
+        # tracks are uploaded while the rest download
+        if telegram and not bot_set.album_zip:
+            album_meta['uploader'] = TelegramUploader(user, album_meta['tracks'])
+
+        # concurrent
+        tasks = []
+        for track in album_meta['tracks']:
+            track['media_key'] = media_key(track['provider'], track['itemid'], session_label(session), quality, Config.TIDAL_SETTINGS['CONVERT_M4A'])
+            if telegram and not bot_set.album_zip and get_file_ids(track['media_key'], 'audio'):
+                # resent by file_id in its turn
+                album_meta['uploader'].cached(
+                    track,
+                    lambda track=track: start_track(track['itemid'], user, track, False, album_folder, session, quality)
+                )
+                continue
+            task = start_track(track['itemid'], user, track, False, album_folder, session, quality)
+            if zipper:
+                task = zipper.track(task, track)
+            elif album_meta['uploader']:
+                task = album_meta['uploader'].track(task, track)
+            tasks.append(task)
+
+        user['progress'] = JobProgress(user['bot_msg'], lang.s.DOWNLOAD_PROGRESS, album_meta['title'], album_meta['type'])
+        await run_concurrent_tasks(tasks, user['progress'], user)
+
+        if bot_set.album_zip:
+            await edit_message(user['bot_msg'], lang.s.ZIPPING)
+            if zipper:
+                album_meta['folderpath'] = await zipper.finish()
+            else:
+                album_meta['folderpath'] = await zip_handler(album_meta['folderpath'], user['bot_msg'])
+
+        # Upload
+        if upload:
+            await edit_message(user['bot_msg'], lang.s.UPLOADING)
+            await album_upload(album_meta, user)
+    finally:
+        if own_zipper:
+            # no-op after finish(), cleans up a failed job
+            await own_zipper.close()
 
 
 
@@ -194,13 +251,25 @@ async def start_artist(artist_id:int, user:dict):
     if bot_set.artist_zip:
         upload_album = False # final decision
 
-    for album in albums:
-        await start_album(album['id'], user, upload_album, artist_meta['folderpath'])
+    zipper = None
+    if bot_set.artist_zip and not bot_set.album_zip:
+        zipper = incremental_zipper(artist_meta['folderpath'])
 
-    if not upload_album:
-        if bot_set.artist_zip:
-            await edit_message(user['bot_msg'], lang.s.ZIPPING)
-            artist_meta['folderpath'] = await zip_handler(artist_meta['folderpath'])
-        
-        await edit_message(user['bot_msg'], lang.s.UPLOADING)
-        await artist_upload(artist_meta, user)
\ No newline at end of file
+    try:
+        for album in albums:
+            await start_album(album['id'], user, upload_album, artist_meta['folderpath'], zipper)
+
+        if not upload_album:
+            if bot_set.artist_zip:
+                await edit_message(user['bot_msg'], lang.s.ZIPPING)
+                if zipper:
+                    artist_meta['folderpath'] = await zipper.finish()
+                else:
+                    artist_meta['folderpath'] = await zip_handler(artist_meta['folderpath'], user['bot_msg'])
+
+            await edit_message(user['bot_msg'], lang.s.UPLOADING)
+            await artist_upload(artist_meta, user)
+    finally:
+        if zipper:
+            # no-op after finish(), cleans up a failed job
+            await zipper.close()
@@ -9,6 +9,7 @@ from bot.helpers.tidal.utils import get_stream_session, parse_mpd
 from bot.helpers.tidal.metadata import get_track_metadata
 from bot.helpers.utils import sanitize_filepath
 from bot.helpers.message import send_message, edit_message
+from bot.helpers.scheduler import download_scheduler
 from bot.logger import LOGGER
 from config import Config
 
@@ -16,7 +17,6 @@ class EnhancedTidalDownloader:
     def __init__(self):
         self.session_cache = {}
         self.metadata_cache = {}
-        self.download_semaphore = asyncio.Semaphore(Config.TIDAL_MAX_CONCURRENT or 5)
         
     async def get_cached_session(self, track_data: dict) -> tuple:
         """Get cached session or create new one"""
@@ -97,23 +97,25 @@ class EnhancedTidalDownloader:
         results = []
         
         for track in tracks_data['items']:
-            async with self.download_semaphore:
-                task = asyncio.create_task(
+            task = asyncio.create_task(
+                download_scheduler.run(
                     self.download_track_with_retry(
                         track['id'],
                         user
-                    )
+                    ),
+                    user
                 )
-                download_tasks.append(task)
-                
-                # Process in smaller batches
-                if len(download_tasks) >= max_concurrent:
-                    batch_results = await asyncio.gather(
-                        *download_tasks, 
-                        return_exceptions=True
-                    )
-                    results.extend(batch_results)
-                    download_tasks = []
+            )
+            download_tasks.append(task)
+
+            # Process in smaller batches
+            if len(download_tasks) >= max_concurrent:
+                batch_results = await asyncio.gather(
+                    *download_tasks, 
+                    return_exceptions=True
+                )
+                results.extend(batch_results)
+                download_tasks = []
                     
         # Process remaining tasks
         if download_tasks:
@@ -1,24 +1,24 @@
-import copy
-
 from datetime import datetime
 
-from ..metadata import metadata as base_meta
-from ..metadata import create_cover_file
+from ..metadata import TrackMeta, CollectionMeta
+from ..metadata import create_cover_files
 
 
 
-async def get_track_metadata(track_id, t_meta, r_id, cover=None, thumbnail=False):
+async def get_track_metadata(track_id, t_meta, r_id, parent=None):
     """
     Args:
         item_id : track id
         t_meta : raw metadata from tidal (pre-fetched)
+        parent : album metadata (cover and temp folder are reused)
     Returns:
-        metadata: dict
+        metadata: TrackMeta
     """
 
-    metadata = copy.deepcopy(base_meta)
+    metadata = TrackMeta(parent)
 
-    metadata['tempfolder'] += f"{r_id}-temp/"
+    if parent is None:
+        metadata['tempfolder'] += f"{r_id}-temp/"
 
     metadata['itemid'] = track_id
     metadata['copyright'] = t_meta['copyright']
@@ -44,15 +44,15 @@ async def get_track_metadata(track_id, t_meta, r_id, cover=None, thumbnail=False
     metadata['provider'] = 'Tidal'
     metadata['type'] = 'track'
 
-    # reuse albumart if possible
-    metadata['cover'] = cover if cover else await get_cover(t_meta['album'].get('cover'), metadata)
-    metadata['thumbnail'] = thumbnail if thumbnail else await get_cover(t_meta['album'].get('cover'), metadata, True)
+    # albumart of the parent is reused
+    if parent is None:
+        metadata['cover'], metadata['thumbnail'] = await get_cover(t_meta['album'].get('cover'), metadata)
 
     return metadata
 
 
 async def get_album_metadata(album_id, a_meta, t_meta, r_id):
-    metadata = copy.deepcopy(base_meta)
+    metadata = CollectionMeta()
 
     metadata['tempfolder'] += f"{r_id}-temp/"
 
@@ -73,20 +73,19 @@ async def get_album_metadata(album_id, a_meta, t_meta, r_id):
     metadata['provider'] = 'Tidal'
     metadata['type'] = 'album'
 
-    metadata['cover'] = await get_cover(a_meta.get('cover'), metadata)
-    metadata['thumbnail'] = await get_cover(a_meta.get('cover'), metadata, True)
+    metadata['cover'], metadata['thumbnail'] = await get_cover(a_meta.get('cover'), metadata)
 
 
     metadata['tracks'] = []
     for track in t_meta['items']:
-        track_meta = await get_track_metadata(track['id'], track, r_id, metadata['cover'], metadata['thumbnail'])
+        track_meta = await get_track_metadata(track['id'], track, r_id, metadata)
         metadata['tracks'].append(track_meta)
     
     return metadata
 
 
 async def get_artist_metadata(a_meta:dict, r_id):
-    metadata = copy.deepcopy(base_meta)
+    metadata = CollectionMeta()
 
     metadata['tempfolder'] += f"{r_id}-temp/"
 
@@ -94,20 +93,19 @@ async def get_artist_metadata(a_meta:dict, r_id):
     metadata['title'] = a_meta['name']
     metadata['provider'] = 'Tidal'
     metadata['type'] = 'artist'
-    metadata['cover'] = await get_cover(a_meta.get('picture'), metadata)
-    metadata['thumbnail'] = await get_cover(a_meta.get('picture'), metadata, True)
+    metadata['cover'], metadata['thumbnail'] = await get_cover(a_meta.get('picture'), metadata)
     return metadata
 
 
-async def get_cover(cover_id, meta:dict, thumbnail=False):
+async def get_cover(cover_id, meta:dict):
+    """
+    Returns:
+        (cover path, thumbnail path)
+    """
     url = None
     if cover_id:
-        url = (
-            f'https://resources.tidal.com/images/{cover_id.replace("-", "/")}/80x80.jpg'
-            if thumbnail
-            else f'https://resources.tidal.com/images/{cover_id.replace("-", "/")}/1280x1280.jpg'
-        )
-    return await create_cover_file(url, meta, thumbnail)
+        url = f'https://resources.tidal.com/images/{cover_id.replace("-", "/")}/1280x1280.jpg'
+    return await create_cover_files(url, meta, cover_id)
 
 
 def get_artists_name(meta:dict):
@@ -1,4 +1,3 @@
-import aiohttp
 import asyncio
 import aiolimiter
 
@@ -7,6 +6,7 @@ from datetime import datetime, timedelta
 from config import Config
 
 from bot.logger import LOGGER
+from bot.helpers.http_pool import http_pool
 
 # from orpheusdl-tidal
 
@@ -124,7 +124,7 @@ class TidalApi:
             auth_url: URL for authorization
             error: if any error occured
         """
-        self.session = aiohttp.ClientSession()
+        self.session = http_pool.client_session()
 
         if Config.TIDAL_TV_TOKEN is None and Config.TIDAL_TV_SECRET is None:
             return False, "No Token/Secret added"
@@ -165,7 +165,7 @@ class TidalApi:
 
 
     async def login_from_saved(self, data):
-        self.session = aiohttp.ClientSession()
+        self.session = http_pool.client_session()
 
         self.tv_session = TvSession(
             Config.TIDAL_TV_TOKEN,
@@ -1,12 +1,17 @@
 import re
 import os
-import aiofiles
+import aiohttp
 import asyncio
 
 from shutil import copyfileobj
+from collections import deque
 from xml.etree import ElementTree
 
+from config import Config
+
 from .tidal_api import tidalapi
+from ..error import DownloadError
+from ..http_pool import http_pool
 
 
 async def parse_url(url):
@@ -78,7 +83,18 @@ async def get_stream_session(track_data: dict):
     quality = tidalapi.quality if format != 'flac_hires' else 'HI_RES_LOSSLESS'
     
     return session, quality
-    
+
+
+def session_label(session) -> str:
+    """
+    Stable name of a stream session for cache keys (the object repr changes every run)
+    Returns:
+        tv_session | mobile_hires | mobile_atmos (class name if unknown)
+    """
+    for name in ('tv_session', 'mobile_hires', 'mobile_atmos'):
+        if session is not None and getattr(tidalapi, name, None) is session:
+            return name
+    return type(session).__name__
 
 
 def parse_mpd(xml: bytes) -> list:
@@ -137,19 +153,73 @@ def parse_mpd(xml: bytes) -> list:
     return tracks, codec
 
 
-async def merge_tracks(temp_tracks: list, output_path: str):
-    async with aiofiles.open(output_path, 'wb') as dest_file:
-        for temp_location in temp_tracks:
-            async with aiofiles.open(temp_location, 'rb') as segment_file:
-                while True:
-                    chunk = await segment_file.read(1024 * 64)  # Read in chunks
-                    if not chunk:
-                        break
-                    await dest_file.write(chunk)
-    
-    # Delete temp files asynchronously
-    delete_tasks = [asyncio.to_thread(os.remove, temp_location) for temp_location in temp_tracks]
-    await asyncio.gather(*delete_tasks)
+async def fetch_segment(url, retries=3, timeout=30) -> bytes:
+    """
+    Fetch a single DASH segment, retrying only this segment on failure
+    """
+    for attempt in range(1, retries + 1):
+        try:
+            async with http_pool.session.get(
+                url,
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+            ) as response:
+                if response.status != 200:
+                    raise DownloadError(f"HTTP Status: {response.status}")
+                return await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt == retries:
+                raise DownloadError(f"Segment failed after {retries} attempts: {str(e)}")
+            await asyncio.sleep(2 ** attempt)
+
+
+async def download_segments(urls: list, output_path: str, window=None, progress=None):
+    """
+    Downloads DASH segments concurrently and writes them in order
+    straight into the output file (no temp segment files)
+    Args:
+        urls: segment urls (init segment first)
+        output_path: final file path
+        window: max segments in flight ahead of the writer
+        progress: JobProgress the written bytes are recorded in
+    Returns:
+        str or None: Error message if any, else None.
+    """
+    window = window or Config.PERFORMANCE['SEGMENTED_DOWNLOAD']['DASH_WINDOW']
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    part = f"{output_path}.part"
+
+    urls = iter(urls)
+    pending = deque()
+    try:
+        for url in urls:
+            pending.append(asyncio.create_task(fetch_segment(url)))
+            if len(pending) >= window:
+                break
+
+        with open(part, 'wb') as f:
+            while pending:
+                data = await pending.popleft()
+                # keep the window full before writing
+                url = next(urls, None)
+                if url is not None:
+                    pending.append(asyncio.create_task(fetch_segment(url)))
+                f.write(data)
+                if progress:
+                    progress.update(output_path, f.tell())
+    except BaseException as e:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        try:
+            os.remove(part)
+        except FileNotFoundError:
+            pass
+        if isinstance(e, DownloadError):
+            return str(e)
+        raise
+
+    os.replace(part, output_path)
+    return None
 
 async def get_quality(stream_data: dict):
     quality_dict = qualities = {
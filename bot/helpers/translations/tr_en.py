@@ -22,6 +22,18 @@ class EN(object):
     DOWNLOADING_FILE = "Downloading File..."
     UPLOADING_FILE = "Uploading File..."
     ZIPPING = 'Zipping........'
+    DOWNLOAD_PROGRESS = """
+<b>╭─ Progress
+│
+├ {0}
+│
+├ Done : <code>{1} / {2}</code>
+│
+├ Title : <code>{3}</code>
+│
+╰─ Type : <code>{4}</code></b>
+"""
+    PROGRESS_SPEED = "\n<b>Speed :</b> <code>{0}/s</code> | <b>ETA :</b> <code>{1}</code>"
     TASK_COMPLETED = "Download Finished"
 
     # Settings Panel Messages
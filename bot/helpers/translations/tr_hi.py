@@ -20,6 +20,7 @@ class HI(object):
 """
     UPLOADING = 'अपलोड हो रहा है........'
     ZIPPING = 'जिप किया जा रहा है........'
+    PROGRESS_SPEED = "\n<b>गति :</b> <code>{0}/s</code> | <b>शेष समय :</b> <code>{1}</code>"
     TASK_COMPLETED = "डाउनलोड समाप्त हुआ"
 
 
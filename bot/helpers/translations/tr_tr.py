@@ -20,6 +20,7 @@ class TR(object):
 """
     UPLOADING = 'Yükleniyor........'
     ZIPPING = 'Arşivleniyor........'
+    PROGRESS_SPEED = "\n<b>Hız :</b> <code>{0}/s</code> | <b>Kalan :</b> <code>{1}</code>"
     TASK_COMPLETED = "İndirme Tamamlandı"
 
 #----------------
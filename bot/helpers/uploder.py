@@ -2,6 +2,13 @@ import os
 
 from ..settings import bot_set
 from .message import send_message, edit_message
+from .tg_files import send_cached, save_file_ids
+from .tg_uploader import TelegramUploader
+from .tg_big_upload import send_document
+from .progress import JobProgress
+from .error import ZipStreamError
+from .rclone import rclone
+from .zipper.stream import ZipStream
 from .utils import *
 
 #
@@ -32,17 +39,18 @@ async def album_upload(metadata, user):
         await local_upload(metadata, user)
     elif bot_set.upload_mode == 'Telegram':
         if bot_set.album_zip:
+            msgs = []
             for item in metadata['folderpath']:
-                await send_message(user,item,'doc', 
-                    caption=await create_simple_text(metadata, user)
-                )
+                msgs.append(await send_zip_part(user, item, metadata))
+            if metadata['media_key']:
+                save_file_ids(metadata['media_key'], 'zip', msgs)
         else:
             await batch_telegram_upload(metadata, user)
     else:
         rclone_link, index_link = await rclone_upload(user, metadata['folderpath'])
         if metadata['poster_msg']:
             try:
-                await edit_art_poster(metadata, user, rclone_link, index_link, await format_string(lang.s.ALBUM_TEMPLATE, metadata, user))
+                await edit_art_poster(metadata, user, rclone_link, index_link, format_text(lang.s.ALBUM_TEMPLATE, metadata, user))
             except MessageNotModified:
                 pass
         else:
@@ -57,16 +65,14 @@ async def artist_upload(metadata, user):
     elif bot_set.upload_mode == 'Telegram':
         if bot_set.artist_zip:
             for item in metadata['folderpath']:
-                await send_message(user,item,'doc', 
-                    caption=await create_simple_text(metadata, user)
-                )
+                await send_zip_part(user, item, metadata)
         else:
             pass # artist telegram uploads are handled by album fucntion
     else:
         rclone_link, index_link = await rclone_upload(user, metadata['folderpath'])
         if metadata['poster_msg']:
             try:
-                await edit_art_poster(metadata, user, rclone_link, index_link, await format_string(lang.s.ARTIST_TEMPLATE, metadata, user))
+                await edit_art_poster(metadata, user, rclone_link, index_link, format_text(lang.s.ARTIST_TEMPLATE, metadata, user))
             except MessageNotModified:
                 pass
         else:
@@ -82,9 +88,7 @@ async def playlist_upload(metadata, user):
     elif bot_set.upload_mode == 'Telegram':
         if bot_set.playlist_zip:
             for item in metadata['folderpath']:
-                await send_message(user,item,'doc', 
-                    caption=await create_simple_text(metadata, user)
-                )
+                await send_zip_part(user, item, metadata)
         else:
             await batch_telegram_upload(metadata, user)
     else:
@@ -92,18 +96,20 @@ async def playlist_upload(metadata, user):
             if bot_set.disable_sort_link:
                 await rclone_upload(user, f"{Config.DOWNLOAD_BASE_DIR}/{user['r_id']}/")
             else:
+                # one batch for all tracks, then the links
+                basepath = f"{Config.DOWNLOAD_BASE_DIR}/{user['r_id']}/"
+                await rclone.copy([track['filepath'] for track in metadata['tracks']], basepath)
                 for track in metadata['tracks']:
                     try:
-                        rclone_link, index_link = await rclone_upload(user, track['filepath'])
-                        if not bot_set.disable_sort_link:
-                            await post_simple_message(user, track, rclone_link, index_link)
+                        rclone_link, index_link = await create_link(track['filepath'], basepath)
+                        await post_simple_message(user, track, rclone_link, index_link)
                     except ValueError: # might try to upload track which is not available
                         pass
         else:
             rclone_link, index_link = await rclone_upload(user, metadata['folderpath'])
             if metadata['poster_msg']:
                 try:
-                    await edit_art_poster(metadata, user, rclone_link, index_link, await format_string(lang.s.PLAYLIST_TEMPLATE, metadata, user))
+                    await edit_art_poster(metadata, user, rclone_link, index_link, format_text(lang.s.PLAYLIST_TEMPLATE, metadata, user))
                 except MessageNotModified:
                     pass
             else:
@@ -119,15 +125,21 @@ async def rclone_upload(user, realpath):
     """
     Args:
         user: user details
-        realpath: full path to (not used for uploading)
+        realpath: full path to the file/folder to upload (or a ZipStream)
     Returns:
         rclone_link, index_link
     """
     path = f"{Config.DOWNLOAD_BASE_DIR}/{user['r_id']}/"
-    cmd = f'rclone copy --config ./rclone.conf "{path}" "{Config.RCLONE_DEST}"'
-    task = await asyncio.create_subprocess_shell(cmd)
-    await task.wait()
-    r_link, i_link = await create_link(realpath, Config.DOWNLOAD_BASE_DIR + f"/{user['r_id']}/")
+    if isinstance(realpath, ZipStream):
+        try:
+            await rclone.rcat(realpath, os.path.relpath(realpath.path, path))
+        except ZipStreamError:
+            # stream does not match its size, upload the zip written to disk
+            await rclone.copy([await asyncio.to_thread(realpath.save)], path)
+        realpath = realpath.path
+    else:
+        await rclone.copy([realpath], path)
+    r_link, i_link = await create_link(realpath, path)
     return r_link, i_link
 
 
@@ -159,28 +171,53 @@ async def local_upload(metadata, user):
     shutil.rmtree(to_move)
 
 
+async def send_zip_part(user, item, metadata):
+    """
+    Args:
+        item: zip part (path or ZipStream)
+        metadata: metadata of the zipped item (caption)
+    """
+    name = item.name if isinstance(item, ZipStream) else os.path.basename(item)
+    progress = JobProgress(user['bot_msg'], f"{lang.s.UPLOADING}\n{name}").start()
+    try:
+        return await send_document(
+            user,
+            item,
+            await create_simple_text(metadata, user),
+            progress.callback(name)
+        )
+    finally:
+        await progress.stop()
+
+
 async def telegram_upload(track, user):
     """
     Only upload a single track
+    Sent by file_id if the same track was already uploaded before
     Args:
         track: track metadata
         """
-    await send_message(user, track['filepath'], 'audio', meta=track)
+    if track.get('media_key'):
+        if await send_cached(user, track['media_key'], 'audio', 'audio', meta=track):
+            return
+    msg = await send_message(user, track['filepath'], 'audio', meta=track)
+    if track.get('media_key'):
+        save_file_ids(track['media_key'], 'audio', [msg])
 
 
 async def batch_telegram_upload(metadata, user):
     """
+    Tracks are uploaded in parallel and posted in order
+    (already running if the uploader was fed during the download)
     Args:
         metadata: full metadata
         user: user details
     """
-    if metadata['type'] == 'album' or metadata['type'] == 'playlist':
-        for track in metadata['tracks']:
-            try:
-                await telegram_upload(track, user)
-            except FileNotFoundError:
-                pass
-    elif metadata['type'] == 'artist':
-        for album in metadata['albums']:
-            for track in album['tracks']:
-                await telegram_upload(track, user)
\ No newline at end of file
+    uploader = metadata['uploader']
+    if uploader is None:
+        if metadata['type'] == 'artist':
+            tracks = [track for album in metadata['albums'] for track in album['tracks']]
+        else:
+            tracks = metadata['tracks']
+        uploader = TelegramUploader(user, tracks)
+    await uploader.finish()
\ No newline at end of file
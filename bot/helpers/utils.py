@@ -1,5 +1,4 @@
 import os
-import math
 import aiohttp
 import asyncio
 import shutil
@@ -7,10 +6,8 @@ import zipfile
 
 from pathlib import Path
 from urllib.parse import quote
-from aiohttp import ClientTimeout
 from pyrogram.errors import MessageNotModified
 from concurrent.futures import ThreadPoolExecutor
-from pyrogram.errors import FloodWait
 
 from config import Config
 import bot.helpers.translations as lang
@@ -18,19 +15,32 @@ import bot.helpers.translations as lang
 from ..logger import LOGGER
 from ..settings import bot_set
 from .buttons.links import links_button
+from .error import DownloadError
+from .downloader import fetch_file, discard_partial
+from .rclone import rclone
+from .template import format_text
+from .zipper.plan import collect_members, choose_compression, plan_parts
+from .zipper.stream import ZipStream, stream_zip
 from .message import send_message, edit_message
+from .progress import JobProgress
+from .scheduler import download_scheduler
+from .tg_files import send_cached, save_file_ids
 
 
 MAX_SIZE = 1.9 * 1024 * 1024 * 1024  # 2GB
 # download folder structure : BASE_DOWNLOAD_DIR + message_r_id
 
-async def download_file(url, path, retries=3, timeout=30):
+async def download_file(url, path, retries=3, timeout=30, segmented=False, reserve=0, progress=None):
     """
+    Retries continue from the bytes already written to `<path>.part`
     Args:
         url (str): URL to download.
         path (str): Path including filename with extension.
         retries (int): Number of retries in case of failure.
-        timeout (int): Timeout duration for the request in seconds.
+        timeout (int): Connect/read timeout for the request in seconds.
+        segmented (bool): Use parallel byte ranges if the server supports it (big files).
+        reserve (int): FLAC padding bytes to reserve for tags (see tag_reserve).
+        progress (JobProgress): job progress the downloaded bytes are recorded in.
     Returns:
         str or None: Error message if any, else None.
     """
@@ -38,24 +48,26 @@ async def download_file(url, path, retries=3, timeout=30):
     
     for attempt in range(1, retries + 1):
         try:
-            async with aiohttp.ClientSession(timeout=ClientTimeout(total=timeout)) as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        with open(path, 'wb') as f:
-                            while True:
-                                chunk = await response.content.read(1024 * 4)
-                                if not chunk:
-                                    break
-                                f.write(chunk)
-                        return None
-                    else:
-                        return f"HTTP Status: {response.status}"
-        except aiohttp.ClientError as e:
+            await fetch_file(
+                url,
+                path,
+                timeout,
+                segmented,
+                progress=progress.callback(path) if progress else None,
+                reserve=reserve
+            )
+            return None
+        except DownloadError as e:
+            discard_partial(path)
+            return str(e)
+        except (aiohttp.ClientError, ConnectionError) as e:
             if attempt == retries:
+                discard_partial(path)
                 return f"Connection failed after {retries} attempts: {str(e)}"
             await asyncio.sleep(2 ** attempt)  # Exponential backoff
         except asyncio.TimeoutError:
             if attempt == retries:
+                discard_partial(path)
                 return "Download failed due to timeout."
             await asyncio.sleep(2 ** attempt)
 
@@ -63,56 +75,33 @@ async def download_file(url, path, retries=3, timeout=30):
 
 async def format_string(text:str, data:dict, user=None):
     """
-    Args:
-        text: text to be formatted
-        data: source info
-        user: user details
+    Async wrapper of template.format_text (kept for old callers)
     Returns:
         str
     """
-    text = text.replace(R'{title}', data['title'])
-    text = text.replace(R'{album}', data['album'])
-    text = text.replace(R'{artist}', data['artist'])
-    text = text.replace(R'{albumartist}', data['albumartist'])
-    text = text.replace(R'{tracknumber}', str(data['tracknumber']))
-    text = text.replace(R'{date}', str(data['date']))
-    text = text.replace(R'{upc}', str(data['upc']))
-    text = text.replace(R'{isrc}', str(data['isrc']))
-    text = text.replace(R'{totaltracks}', str(data['totaltracks']))
-    text = text.replace(R'{volume}', str(data['volume']))
-    text = text.replace(R'{totalvolume}', str(data['totalvolume']))
-    text = text.replace(R'{extension}', data['extension'])
-    text = text.replace(R'{duration}', str(data['duration']))
-    text = text.replace(R'{copyright}', data['copyright'])
-    text = text.replace(R'{genre}', data['genre'])
-    text = text.replace(R'{provider}', data['provider'].title())
-    text = text.replace(R'{quality}', data['quality'])
-    text = text.replace(R'{explicit}', str(data['explicit']))
-    if user:
-        text = text.replace(R'{user}', user['name'])
-        text = text.replace(R'{username}', user['user_name'])
-    return text
+    return format_text(text, data, user)
 
 
 
-async def run_concurrent_tasks(tasks, progress_details=None):
+async def run_concurrent_tasks(tasks, progress=None, user=None):
     """
     Args:
         tasks: (list) async functions to be run
-        progress_details: details for progress message (dict)    
+        progress: JobProgress shown while the tasks run
+        user: user details (owner of the download slots)
     """
-    semaphore = asyncio.Semaphore(Config.MAX_WORKERS)
-
-    i = [0]
-    l = len(tasks)
     async def sem_task(task):
-        async with semaphore:
-            result = await task
-            if progress_details and result:
-                i[0]+=1 # currently done
-                await progress_message(i[0], l, progress_details)
+        result = await download_scheduler.run(task, user)
+        if progress and result:
+            progress.task_done()
 
-    await asyncio.gather(*(sem_task(task) for task in tasks))
+    if progress:
+        progress.start(len(tasks))
+    try:
+        await asyncio.gather(*(sem_task(task) for task in tasks))
+    finally:
+        if progress:
+            await progress.stop()
 
 
 async def create_link(path, basepath):
@@ -131,20 +120,7 @@ async def create_link(path, basepath):
     index_link = None
 
     if bot_set.link_options == 'RCLONE' or bot_set.link_options=='Both':
-        cmd = f'rclone link --config ./rclone.conf "{Config.RCLONE_DEST}/{path}"'
-        task = await asyncio.create_subprocess_shell(
-            cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-
-        stdout, stderr = await task.communicate()
-
-        if task.returncode == 0:
-            rclone_link = stdout.decode().strip()
-        else:
-            error_message = stderr.decode().strip()
-            LOGGER.debug(f"Failed to get link: {error_message}")
+        rclone_link = await rclone.link(path)
     if bot_set.link_options == 'Index' or bot_set.link_options=='Both':
         if Config.INDEX_LINK:
             index_link =  Config.INDEX_LINK + '/' + quote(path)
@@ -152,60 +128,97 @@ async def create_link(path, basepath):
     return rclone_link, index_link
 
 
-async def zip_handler(folderpath):
+async def zip_handler(folderpath, msg=None):
+    """
+    Args:
+        folderpath: folder to zip
+        msg: Message to show the zip progress on (optional)
+    Returns:
+        Telegram: list of zip parts, else a single zip
+        (ZipStream objects instead of paths when the zip can be streamed)
+    """
+    if Config.ZIP_SETTINGS['STREAM'] and bot_set.upload_mode != 'Local':
+        members = collect_members(folderpath)
+        if choose_compression(path for path, _, _ in members) == zipfile.ZIP_STORED:
+            if bot_set.upload_mode == 'Telegram':
+                return stream_zip(folderpath, members, Config.ZIP_SETTINGS['TELEGRAM_LIMIT'])
+            return stream_zip(folderpath, members)[0]
+
     loop = asyncio.get_running_loop()
     with ThreadPoolExecutor() as pool:
         if bot_set.upload_mode == 'Telegram':
-            zips = await loop.run_in_executor(pool, split_zip_folder, folderpath)
+            progress = JobProgress(msg, lang.s.ZIPPING).start() if msg else None
+            try:
+                zips = await loop.run_in_executor(
+                    pool,
+                    split_zip_folder,
+                    folderpath,
+                    progress.update if progress else None
+                )
+            finally:
+                if progress:
+                    await progress.stop()
         else:
             zips = await loop.run_in_executor(pool, zip_folder, folderpath)
         return zips
 
 
-def split_zip_folder(folderpath) -> list:
+def write_zip_part(zip_path, members, compression, part_num=1, progress=None):
     """
+    Args:
+        zip_path: output zip
+        members: list of (file path, arcname, size)
+        compression: zipfile compression
+        progress: callback(part_num, done_bytes, total_bytes) - called from the worker thread
+    """
+    total = sum(size for _, _, size in members)
+    done = 0
+    with zipfile.ZipFile(zip_path, 'w', compression) as zipf:
+        for file_path, arcname, size in members:
+            zipf.write(file_path, arcname)
+            os.remove(file_path)  # Delete the file after zipping
+            done += size
+            if progress:
+                progress(part_num, done, total)
+    return zip_path
+
+
+def split_zip_folder(folderpath, progress=None) -> list:
+    """
+    Parts are planned first (album folders kept together where possible)
+    and then built in parallel, one thread per part
     Args:
         folderpath: path to folder to zip
+        progress: callback(part_num, done_bytes, total_bytes)
     Returns:
         list of zip file paths
     """
-    zip_paths = []
-    part_num = 1
-    current_size = 0
-    current_files = []
+    members = collect_members(folderpath)
+    compression = choose_compression(path for path, _, _ in members)
 
-    def add_to_zip(zip_name, files_to_add):
+    if compression == zipfile.ZIP_STORED:
+        # sizes are known exactly, fill each part up to the telegram limit
+        plans = plan_parts(members, Config.ZIP_SETTINGS['TELEGRAM_LIMIT'])
+    else:
+        plans = plan_parts(members, MAX_SIZE, stored=False)
+    plans = [plan for plan in plans if plan.members]
+
+    zip_paths = []
+    for part_num in range(1, len(plans) + 1):
         if part_num == 1:
-            zip_path = f"{zip_name}.zip"
+            zip_paths.append(f"{folderpath}.zip")
         else:
-            zip_path = f"{zip_name}.part{part_num}.zip"
-
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file_path, arcname in files_to_add:
-                zipf.write(file_path, arcname)
-                os.remove(file_path)  # Delete the file after zipping
-        return zip_path
-
-    for root, dirs, files in os.walk(folderpath):
-        for file in files:
-            file_path = os.path.join(root, file)
-            file_size = os.path.getsize(file_path)
-            arcname = os.path.relpath(file_path, folderpath)
-
-            # If adding this file would exceed the max size, create a zip for the current files
-            if current_size + file_size > MAX_SIZE:
-                zip_paths.append(add_to_zip(folderpath, current_files))
-                part_num += 1
-                current_files = []  # Reset for the next zip part
-                current_size = 0
-
-            # Add the file to the current group
-            current_files.append((file_path, arcname))
-            current_size += file_size
-
-    # Create the final zip with any remaining files
-    if current_files:
-        zip_paths.append(add_to_zip(folderpath, current_files))
+            zip_paths.append(f"{folderpath}.part{part_num}.zip")
+
+    if not plans:
+        return zip_paths
+    with ThreadPoolExecutor(max_workers=min(len(plans), os.cpu_count() or 1)) as pool:
+        futures = [
+            pool.submit(write_zip_part, zip_path, plan.members, compression, part_num, progress)
+            for part_num, (zip_path, plan) in enumerate(zip(zip_paths, plans), 1)
+        ]
+        for future in futures:
+            future.result()
 
     return zip_paths
 
@@ -218,14 +231,14 @@ def zip_folder(folderpath) -> str:
         str: The path to the created zip file.
     """
     zip_path = f"{folderpath}.zip"
+    members = collect_members(folderpath)
+    compression = choose_compression(path for path, _, _ in members)
     
-    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for root, dirs, files in os.walk(folderpath):
-            for file in files:
-                file_path = os.path.join(root, file)
-                zipf.write(file_path, os.path.relpath(file_path, folderpath))
-                # Remove file after adding to the zip
-                os.remove(file_path)
+    with zipfile.ZipFile(zip_path, 'w', compression) as zipf:
+        for file_path, arcname, _ in members:
+            zipf.write(file_path, arcname)
+            # Remove file after adding to the zip
+            os.remove(file_path)
     
     return zip_path
 
@@ -263,26 +276,28 @@ async def post_art_poster(user:dict, meta:dict):
     """
     photo = meta['cover']
     if meta['type'] == 'album':
-        caption = await format_string(lang.s.ALBUM_TEMPLATE, meta, user)
+        caption = format_text(lang.s.ALBUM_TEMPLATE, meta, user)
     else:
-        caption = await format_string(lang.s.PLAYLIST_TEMPLATE, meta, user)
+        caption = format_text(lang.s.PLAYLIST_TEMPLATE, meta, user)
     
     if bot_set.art_poster:
+        if meta['media_key']:
+            msgs = await send_cached(user, meta['media_key'], 'poster', 'pic', caption)
+            if msgs:
+                return msgs[0]
         msg = await send_message(user, photo, 'pic', caption)
+        if meta['media_key']:
+            save_file_ids(meta['media_key'], 'poster', [msg])
         return msg
 
 
 async def create_simple_text(meta, user):
-    caption = await format_string(
-        lang.s.SIMPLE_TITLE.format(
-            meta['title'],
-            meta['type'].title(),
-            meta['provider']
-        ), 
-        meta, 
-        user
+    # already filled, a second pass would expand braces inside the title
+    return lang.s.SIMPLE_TITLE.format(
+        meta['title'],
+        meta['type'].title(),
+        meta['provider']
     )
-    return caption
 
 
 async def edit_art_poster(metadata, user, r_link, i_link, caption):
@@ -315,35 +330,6 @@ async def post_simple_message(user, meta, r_link=None, i_link=None):
     await send_message(user, caption, markup=markup)
 
 
-async def progress_message(done, total, details):
-    """
-    Args:
-        done: how much task done
-        total: total number of tasks
-        details: Message, text (dict)
-    """
-    progress_bar = "{0}{1}".format(
-        ''.join(["▰" for i in range(math.floor((done/total) * 10))]),
-        ''.join(["▱" for i in range(10 - math.floor((done/total) * 10))])
-    )
-
-    try:
-        await edit_message(
-            details['msg'],
-            details['text'].format(
-                progress_bar, 
-                done, 
-                total, 
-                details['title'],
-                details['type'].title()
-            ),
-            None,
-            False
-        )
-    except FloodWait as e:
-        pass # dont update the message if flooded
-
-
 async def cleanup(user=None, metadata=None, ):
     """
     Clean up after task completed - For concurrent downloads
@@ -364,11 +350,15 @@ async def cleanup(user=None, metadata=None, ):
             else:
                 is_zip = True if bot_set.playlist_zip else False
             if is_zip:
-                if type(metadata['folderpath']) == list:
-                    for i in metadata['folderpath']:
+                zips = metadata['folderpath']
+                for i in zips if type(zips) == list else [zips]:
+                    if isinstance(i, ZipStream):
+                        # streamed zip, the source files (and a zip saved as fallback) are on disk
+                        shutil.rmtree(i.folder, ignore_errors=True)
+                        if os.path.exists(i.path):
+                            os.remove(i.path)
+                    else:
                         os.remove(i)
-                else:
-                    os.remove(metadata['folderpath'])
             else:
                 shutil.rmtree(metadata['folderpath'])
         except FileNotFoundError:
@@ -1,60 +1,99 @@
 import asyncio
-import aiofiles
 import zipfile
+import threading
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Callable
 from bot.config import Config
 from bot.logger import LOGGER
+import bot.helpers.translations as lang
+from ..progress import JobProgress
+from .plan import choose_compression, plan_parts
 
 class AsyncZipper:
+    """
+    Zip engine that never blocks the event loop.
+    Archives are written in a worker thread, file data is copied through one
+    reusable buffer (memory stays at CHUNK_SIZE per build), parts are real
+    independent archives cut with the size plan and progress is reported at
+    a fixed rate from the loop side.
+    """
     def __init__(self):
-        self.chunk_size = Config.ZIP_SETTINGS['CHUNK_SIZE']
+        self.chunk_size = Config.PERFORMANCE['CHUNK_SIZE']
         self.max_size = Config.ZIP_SETTINGS['MAX_SIZE']
-        self._compress_semaphore = asyncio.Semaphore(5)
-        self._memory_pool = []
-        self._max_memory = Config.PERFORMANCE['MEMORY_LIMIT']
+        self.progress_interval = Config.ZIP_SETTINGS['PROGRESS_UPDATE_INTERVAL']
         self._progress_callback = None
-        
-    async def validate_files(self, files: List[str]) -> bool:
-        """Validate files before zipping"""
-        try:
-            total_size = 0
-            for file_path in files:
-                if not Path(file_path).exists():
-                    LOGGER.error(f"File not found: {file_path}")
-                    continue
-                    
-                if Path(file_path).suffix.lower() not in Config.ZIP_SETTINGS['ALLOWED_TYPES']:
-                    LOGGER.warning(f"Skipping unsupported file: {file_path}")
-                    continue
-                    
-                file_size = Path(file_path).stat().st_size
-                if file_size > Config.SECURITY['MAX_FILE_SIZE']:
-                    LOGGER.warning(f"File too large, will be split: {file_path}")
-                    
-                total_size += file_size
-                
-            return total_size <= self.max_size
-            
-        except Exception as e:
-            LOGGER.error(f"File validation failed: {str(e)}")
-            return False
+        self._processed = 0
+        self._cancel = threading.Event()
+
+    def set_progress_callback(self, callback: Optional[Callable]):
+        """
+        Args:
+            callback: async callback(processed_bytes, total_bytes, speed)
+        """
+        self._progress_callback = callback
+
+    async def validate_files(self, files: List[str]) -> List[str]:
+        """
+        Returns:
+            files that exist and have an allowed type
+        """
+        valid = []
+        for file_path in files:
+            path = Path(file_path)
+            if not path.is_file():
+                LOGGER.error(f"File not found: {file_path}")
+                continue
+            if path.suffix.lower() not in Config.ZIP_SETTINGS['ALLOWED_TYPES']:
+                LOGGER.warning(f"Skipping unsupported file: {file_path}")
+                continue
+            valid.append(file_path)
+        return valid
+
+    @staticmethod
+    def _part_path(output_path: str, part_num: int) -> str:
+        if part_num == 1:
+            return output_path
+        base = output_path[:-4] if output_path.endswith('.zip') else output_path
+        return f"{base}.part{part_num}.zip"
 
-    async def _read_file_chunks(self, file_path: str):
-        """Read file in chunks"""
-        async with aiofiles.open(file_path, 'rb') as f:
-            while chunk := await f.read(self.chunk_size):
-                yield chunk
+    def _write_part(self, zip_path: str, members: list, compression: int, buffer: bytearray):
+        view = memoryview(buffer)
+        with zipfile.ZipFile(
+            zip_path,
+            'w',
+            compression=compression,
+            compresslevel=Config.ZIP_SETTINGS['COMPRESSION_LEVEL']
+        ) as zf:
+            for file_path, arcname, _ in members:
+                zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+                zinfo.compress_type = compression
+                # zf.open() takes the level from the ZipInfo, not from the ZipFile
+                zinfo._compresslevel = zf.compresslevel
+                with open(file_path, 'rb') as src, zf.open(zinfo, 'w') as dest:
+                    while n := src.readinto(view):
+                        if self._cancel.is_set():
+                            raise InterruptedError("zip cancelled")
+                        dest.write(view[:n])
+                        self._processed += n
 
-    async def _check_memory(self, size: int) -> bool:
-        """Check memory availability"""
-        current_usage = sum(len(item) for item in self._memory_pool)
-        return (current_usage + size) <= self._max_memory
+    def _build(self, parts: list, output_path: str, compression: int) -> List[str]:
+        buffer = bytearray(self.chunk_size)
+        zip_files = []
+        for part_num, plan in enumerate(parts, 1):
+            zip_path = self._part_path(output_path, part_num)
+            zip_files.append(zip_path)
+            self._write_part(zip_path, plan.members, compression, buffer)
+        return zip_files
 
-    async def _clear_memory(self):
-        """Clear memory pool"""
-        while self._memory_pool:
-            self._memory_pool.pop()
+    async def _report(self, total: int, start_time: float, progress: Optional[JobProgress] = None):
+        loop = asyncio.get_running_loop()
+        elapsed = loop.time() - start_time
+        speed = self._processed / elapsed if elapsed else 0
+        if self._progress_callback:
+            await self._progress_callback(self._processed, total, speed)
+        if progress:
+            # the message is rendered by the progress ticker
+            progress.update('zip', self._processed, total)
 
     async def create_zip(
         self,
@@ -63,82 +102,44 @@ class AsyncZipper:
         split_size: Optional[int] = None,
         message = None
     ) -> List[str]:
-        """Create ZIP file with memory management and progress tracking"""
+        """
+        Create a zip of the files, split into independent archives of at most
+        split_size bytes (estimated from uncompressed size if deflated)
+        Returns:
+            list of created zip paths
+        """
         split_size = split_size or Config.ZIP_SETTINGS['SPLIT_SIZE']
-        zip_files = []
-        current_zip = 1
-        current_size = 0
-        
+        files = await self.validate_files(files)
+        if not files:
+            raise ValueError("File validation failed")
+
+        members = [(f, Path(f).name, Path(f).stat().st_size) for f in files]
+        compression = choose_compression(files)
+        parts = plan_parts(members, split_size, stored=compression == zipfile.ZIP_STORED)
+        total = sum(size for _, _, size in members)
+
+        loop = asyncio.get_running_loop()
+        self._processed = 0
+        self._cancel.clear()
+        start_time = loop.time()
+        progress = JobProgress(message, lang.s.ZIPPING).start() if message else None
+        future = loop.run_in_executor(None, self._build, parts, output_path, compression)
         try:
-            # Validate files first
-            if not await self.validate_files(files):
-                raise ValueError("File validation failed")
-            
-            async with aiofiles.open(output_path, 'wb') as zip_file:
-                with zipfile.ZipFile(
-                    zip_file, 
-                    'w',
-                    compression=zipfile.ZIP_DEFLATED,
-                    compresslevel=Config.ZIP_SETTINGS['COMPRESSION_LEVEL']
-                ) as zf:
-                    total_size = sum(Path(f).stat().st_size for f in files)
-                    processed_size = 0
-                    start_time = asyncio.get_event_loop().time()
-                    
-                    for file_path in files:
-                        async with self._compress_semaphore:
-                            if not Path(file_path).exists():
-                                LOGGER.warning(f"File not found: {file_path}")
-                                continue
-                                
-                            file_size = Path(file_path).stat().st_size
-                            
-                            # Check if need to split
-                            if current_size + file_size > split_size:
-                                zip_files.append(output_path)
-                                output_path = f"{output_path}.part{current_zip}"
-                                current_zip += 1
-                                current_size = 0
-                                
-                            # Add file to zip
-                            current_file_size = 0
-                            async for chunk in self._read_file_chunks(file_path):
-                                if not await self._check_memory(len(chunk)):
-                                    await self._clear_memory()
-                                    
-                                self._memory_pool.append(chunk)
-                                current_size += len(chunk)
-                                current_file_size += len(chunk)
-                                processed_size += len(chunk)
-                                
-                                # Update progress
-                                if message and (asyncio.get_event_loop().time() - start_time) >= Config.PERFORMANCE['PROGRESS_UPDATE_DELAY']:
-                                    progress = (processed_size * 100) / total_size
-                                    speed = processed_size / (asyncio.get_event_loop().time() - start_time)
-                                    await message.edit_text(
-                                        f"Zipping: {progress:.1f}%\n"
-                                        f"Speed: {format_size(speed)}/s"
-                                    )
-                                    
-                            # Write file to zip
-                            zf.write(
-                                file_path,
-                                arcname=Path(file_path).name
-                            )
-                            
-                            # Clear memory after each file
-                            await self._clear_memory()
-                            
-            zip_files.append(output_path)
+            while True:
+                done, _ = await asyncio.wait([future], timeout=self.progress_interval)
+                if done:
+                    break
+                await self._report(total, start_time, progress)
+            zip_files = await future
+            await self._report(total, start_time, progress)
             return zip_files
-            
-        except Exception as e:
+        except BaseException as e:
+            self._cancel.set()
+            await asyncio.wait([future])
             LOGGER.error(f"ZIP creation failed: {str(e)}")
-            # Cleanup temp files
-            for zip_file in zip_files:
-                try:
-                    if Path(zip_file).exists():
-                        Path(zip_file).unlink()
-                except:
-                    pass
-            raise e
+            for part_num in range(1, len(parts) + 1):
+                Path(self._part_path(output_path, part_num)).unlink(missing_ok=True)
+            raise
+        finally:
+            if progress:
+                await progress.stop()
@@ -0,0 +1,158 @@
+import os
+import queue
+import asyncio
+import zipfile
+import threading
+
+from config import Config
+from bot.settings import bot_set
+from bot.logger import LOGGER
+
+from .plan import ZipPlan, choose_compression, is_partial
+
+
+# deflated sizes are not known in advance, keep the old safety margin for them
+DEFLATED_LIMIT = 1.9 * 1024 * 1024 * 1024
+
+
+class IncrementalZipper:
+    """
+    Zips the tracks of a folder while the rest are still downloading.
+    Finished tracks are queued and written by one worker thread; finish()
+    waits for the queue and closes the archive (central directory), close()
+    aborts a failed job (stops the worker, removes the partial parts).
+    Args:
+        folderpath: folder the tracks are downloaded into
+        split: cut into telegram sized parts (like split_zip_folder)
+    """
+    def __init__(self, folderpath, split=False):
+        self.folderpath = folderpath
+        self.split = split
+        self.zip_paths = []
+        self._queue = queue.Queue()
+        self._error = None
+        self._zip = None
+        self._plan = None
+        self._deflated = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def add(self, path):
+        """Queue a finished file (it is deleted once written to the zip)"""
+        self._queue.put(path)
+
+    async def track(self, task, track_meta:dict):
+        """
+        Wrap a start_track() coroutine so its file is zipped as soon as it is done
+        """
+        result = await task
+        if result and track_meta['filepath'] and os.path.isfile(track_meta['filepath']):
+            self.add(track_meta['filepath'])
+        return result
+
+    async def finish(self):
+        """
+        Returns:
+            list of zip parts if split, else the zip path
+        """
+        self._closed = True
+        self._queue.put(None)
+        await asyncio.to_thread(self._thread.join)
+        try:
+            if self._error:
+                raise self._error
+            # files which were not queued (eg: added by other steps) still go in
+            leftovers = []
+            for root, dirs, files in os.walk(self.folderpath):
+                leftovers.extend(os.path.join(root, file) for file in files if not is_partial(file))
+            if leftovers:
+                await asyncio.to_thread(self._write_all, leftovers)
+            if self._zip is None:
+                # nothing downloaded, still give an (empty) archive like zip_folder
+                self._next_part()
+            self._zip.close()
+        except BaseException:
+            self._discard()
+            raise
+        return self.zip_paths if self.split else self.zip_paths[0]
+
+    async def close(self):
+        """Abort: stop the worker and remove the partial zip (no-op after finish)"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        await asyncio.to_thread(self._thread.join)
+        self._discard()
+
+    def _discard(self):
+        if self._zip is not None:
+            try:
+                self._zip.close()
+            except Exception as e:
+                LOGGER.debug(f"ZIP : Closing partial zip failed - {e}")
+            self._zip = None
+        for zip_path in self.zip_paths:
+            try:
+                os.remove(zip_path)
+            except FileNotFoundError:
+                pass
+
+    def _next_part(self):
+        if self._zip is not None:
+            self._zip.close()
+        part_num = len(self.zip_paths) + 1
+        if part_num == 1:
+            zip_path = f"{self.folderpath}.zip"
+        else:
+            zip_path = f"{self.folderpath}.part{part_num}.zip"
+        self.zip_paths.append(zip_path)
+        self._zip = zipfile.ZipFile(zip_path, 'w')
+        self._plan = ZipPlan()
+        self._deflated = False
+
+    def _write(self, path):
+        arcname = os.path.relpath(path, self.folderpath)
+        size = os.path.getsize(path)
+        compression = choose_compression([path])
+        deflated = self._deflated or compression == zipfile.ZIP_DEFLATED
+
+        if self._zip is None:
+            self._next_part()
+        elif self.split and self._plan.members:
+            limit = DEFLATED_LIMIT if deflated else Config.ZIP_SETTINGS['TELEGRAM_LIMIT']
+            if self._plan.size_with(arcname, size) > limit:
+                self._next_part()
+
+        self._zip.write(path, arcname, compress_type=compression)
+        self._plan.add((path, arcname, size))
+        self._deflated = self._deflated or compression == zipfile.ZIP_DEFLATED
+        os.remove(path)
+
+    def _write_all(self, paths):
+        for path in paths:
+            self._write(path)
+
+    def _worker(self):
+        while (path := self._queue.get()) is not None:
+            if self._error:
+                continue
+            try:
+                self._write(path)
+            except Exception as e:
+                LOGGER.error(f"ZIP : Failed to add {path} - {e}")
+                self._error = e
+
+
+def incremental_zipper(folderpath):
+    """
+    Returns:
+        IncrementalZipper if the zip of this folder will be written to disk,
+        None if zip_handler streams it during upload anyway
+    """
+    if not Config.ZIP_SETTINGS['INCREMENTAL'] or folderpath is None:
+        return None
+    if Config.ZIP_SETTINGS['STREAM'] and bot_set.upload_mode != 'Local':
+        return None
+    return IncrementalZipper(folderpath, split=bot_set.upload_mode == 'Telegram')
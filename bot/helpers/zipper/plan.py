@@ -0,0 +1,185 @@
+import os
+import zipfile
+
+
+# audio formats that do not shrink when deflated
+PRECOMPRESSED = ('.flac', '.mp3', '.m4a', '.mp4', '.aac', '.ogg', '.opus')
+
+# record sizes as written by the zipfile module
+LOCAL_HEADER = 30
+CENTRAL_HEADER = 46
+END_RECORD = 22
+ZIP64_END = 56 + 20  # zip64 end record + locator
+ZIP64_LOCAL_EXTRA = 20
+DATA_DESCRIPTOR = 16
+ZIP64_DATA_DESCRIPTOR = 24
+FILECOUNT_LIMIT = 0xFFFF
+
+# leftovers of unfinished downloads (see downloader.PartFile)
+PARTIAL = ('.part', '.part.json')
+
+
+def is_partial(name) -> bool:
+    """Leftover of an unfinished download (`.part` file or its sidecar)"""
+    return name.endswith(PARTIAL)
+
+
+def collect_members(folderpath) -> list:
+    """
+    Returns:
+        list of (file path, arcname, size) for all files under folderpath
+        (unfinished downloads skipped)
+    """
+    members = []
+    for root, dirs, files in os.walk(folderpath):
+        for file in files:
+            if is_partial(file):
+                continue
+            file_path = os.path.join(root, file)
+            members.append((file_path, os.path.relpath(file_path, folderpath), os.path.getsize(file_path)))
+    return members
+
+
+def is_precompressed(path) -> bool:
+    return os.path.splitext(path)[1].lower() in PRECOMPRESSED
+
+
+def choose_compression(paths) -> int:
+    """
+    Returns:
+        ZIP_STORED if every file is already compressed audio, else ZIP_DEFLATED
+    """
+    paths = list(paths)
+    if paths and all(is_precompressed(path) for path in paths):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def _encoded_name(arcname) -> bytes:
+    filename = zipfile.ZipInfo(arcname).filename
+    try:
+        return filename.encode('ascii')
+    except UnicodeEncodeError:
+        return filename.encode('utf-8')
+
+
+class ZipPlan:
+    """
+    Exact byte size of a ZIP_STORED archive, member by member.
+    Mirrors the records the zipfile module writes (zip64 extras included),
+    so archives can be cut at a size limit before writing anything.
+    Args:
+        descriptor: members are followed by a data descriptor (unseekable output)
+    """
+    def __init__(self, descriptor=False):
+        self.descriptor = descriptor
+        self.members = []
+        self.local_size = 0  # local headers + data = offset of the central directory
+        self.central_size = 0
+
+    def _entry(self, arcname, size, offset) -> tuple:
+        name = len(_encoded_name(arcname))
+        zip64 = size * 1.05 > zipfile.ZIP64_LIMIT
+
+        local = LOCAL_HEADER + name + size
+        if zip64:
+            local += ZIP64_LOCAL_EXTRA
+        if self.descriptor:
+            local += ZIP64_DATA_DESCRIPTOR if zip64 else DATA_DESCRIPTOR
+
+        extra = 0
+        if size > zipfile.ZIP64_LIMIT:
+            extra += 2  # file size, compressed size
+        if offset > zipfile.ZIP64_LIMIT:
+            extra += 1  # header offset
+        central = CENTRAL_HEADER + name + (4 + 8 * extra if extra else 0)
+        return local, central
+
+    @staticmethod
+    def _end(count, central_offset, central_size) -> int:
+        if count > FILECOUNT_LIMIT or central_offset > zipfile.ZIP64_LIMIT \
+                or central_size > zipfile.ZIP64_LIMIT:
+            return ZIP64_END + END_RECORD
+        return END_RECORD
+
+    @property
+    def size(self) -> int:
+        return self.local_size + self.central_size + \
+            self._end(len(self.members), self.local_size, self.central_size)
+
+    def size_with(self, arcname, size) -> int:
+        """Archive size if the member was added"""
+        local, central = self._entry(arcname, size, self.local_size)
+        local_size = self.local_size + local
+        central_size = self.central_size + central
+        return local_size + central_size + self._end(len(self.members) + 1, local_size, central_size)
+
+    def add(self, member):
+        """
+        Args:
+            member: (file path, arcname, size)
+        """
+        local, central = self._entry(member[1], member[2], self.local_size)
+        self.local_size += local
+        self.central_size += central
+        self.members.append(member)
+
+
+class RawPlan:
+    """Size estimate of a deflated archive (sum of the uncompressed sizes)"""
+    def __init__(self):
+        self.members = []
+        self.size = 0
+
+    def size_with(self, arcname, size) -> int:
+        return self.size + size
+
+    def add(self, member):
+        self.members.append(member)
+        self.size += member[2]
+
+
+def _group(arcname) -> str:
+    # album folder of the member ('' for files in the root)
+    parts = arcname.replace(os.sep, '/').split('/')
+    return parts[0] if len(parts) > 1 else ''
+
+
+def plan_parts(members:list, limit:int, stored=True, descriptor=False) -> list:
+    """
+    Split members into archives of at most limit bytes, keeping each album
+    folder inside a single part where possible (folders bigger than the
+    limit are spread over parts, a file bigger than it gets its own part)
+    Args:
+        members: list of (file path, arcname, size)
+        limit: max archive size in bytes
+        stored: exact ZipPlan sizes, else uncompressed size estimate
+        descriptor: ZipPlan descriptor layout (streamed archives)
+    Returns:
+        list of ZipPlan/RawPlan
+    """
+    def new_plan():
+        return ZipPlan(descriptor) if stored else RawPlan()
+
+    groups = {}
+    for member in members:
+        groups.setdefault(_group(member[1]), []).append(member)
+
+    parts = [new_plan()]
+    for group in groups.values():
+        # does the whole folder fit in the current part / an empty part
+        trial = new_plan()
+        for member in parts[-1].members + group:
+            trial.add(member)
+        if parts[-1].members and trial.size > limit:
+            alone = new_plan()
+            for member in group:
+                alone.add(member)
+            if alone.size <= limit:
+                parts.append(alone)
+                continue
+        for member in group:
+            if parts[-1].members and parts[-1].size_with(member[1], member[2]) > limit:
+                parts.append(new_plan())
+            parts[-1].add(member)
+    return parts
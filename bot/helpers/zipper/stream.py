@@ -0,0 +1,149 @@
+import io
+import os
+import zipfile
+
+from bot.logger import LOGGER
+
+from ..error import ZipStreamError
+from .plan import ZipPlan, plan_parts
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class _Sink(io.RawIOBase):
+    """Unseekable output collecting zipfile writes into a buffer"""
+    def __init__(self, buffer:bytearray):
+        self.buffer = buffer
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.buffer += b
+        return len(b)
+
+
+class ZipStream(io.RawIOBase):
+    """
+    Read-only file object producing a ZIP_STORED archive on the fly.
+    Nothing is written to disk, the archive bytes are generated from the
+    source files while the consumer (telegram upload, rclone rcat) reads.
+    The size is known up front from the ZipPlan (data descriptor layout);
+    reads raise ZipStreamError if the archive turns out bigger or smaller,
+    the caller then sends the zip written to disk by save() instead.
+    Args:
+        plan: ZipPlan(descriptor=True) of the members
+        path: path the zip would have on disk (used for its name and links)
+        folder: source folder of the members
+    """
+    def __init__(self, plan:ZipPlan, path:str, folder:str):
+        super().__init__()
+        self.plan = plan
+        self.path = path
+        self.name = os.path.basename(path)
+        self.folder = folder
+        self.size = plan.size
+        self._reset()
+
+    def _reset(self):
+        self._buffer = bytearray()
+        self._pos = 0
+        self._chunks = self._generate()
+
+    def _generate(self):
+        with zipfile.ZipFile(_Sink(self._buffer), 'w', zipfile.ZIP_STORED) as zf:
+            for file_path, arcname, _ in self.plan.members:
+                zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+                with open(file_path, 'rb') as src, zf.open(zinfo, 'w') as dest:
+                    while chunk := src.read(CHUNK_SIZE):
+                        dest.write(chunk)
+                        yield
+        # central directory written on close
+        yield
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        while len(self._buffer) < len(b):
+            try:
+                next(self._chunks)
+            except StopIteration:
+                break
+        if self._pos + len(self._buffer) > self.size:
+            self._mismatch(f"more than {self.size}")
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        del self._buffer[:n]
+        self._pos += n
+        if n == 0 and len(b) and self._pos != self.size:
+            self._mismatch(self._pos)
+        return n
+
+    def _mismatch(self, size):
+        # the upload was announced with the planned size, never send anything else
+        LOGGER.error(f"ZIP : {self.name} is {size} bytes, planned {self.size}")
+        raise ZipStreamError(f"{self.name} does not match its planned size")
+
+    def save(self) -> str:
+        """
+        Write the archive to its path on disk (source files are kept)
+        Returns:
+            zip path
+        """
+        with zipfile.ZipFile(self.path, 'w', zipfile.ZIP_STORED) as zf:
+            for file_path, arcname, _ in self.plan.members:
+                zf.write(file_path, arcname)
+        return self.path
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET) -> int:
+        """
+        Only supports rewinding to the start and jumping to the end
+        (what uploaders do to get the size)
+        """
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset == 0:
+            self._reset()
+        elif offset == self.size:
+            self._pos = self.size
+            self._buffer.clear()
+            self._chunks = iter(())
+        elif offset != self._pos:
+            raise io.UnsupportedOperation("ZipStream can only seek to start or end")
+        return self._pos
+
+
+def stream_zip(folderpath, members:list, limit:int=None) -> list:
+    """
+    Args:
+        folderpath: folder being zipped
+        members: collect_members() of the folder (all stored)
+        limit: max size of each part (None for a single archive)
+    Returns:
+        list of ZipStream, named like split_zip_folder() parts
+    """
+    if limit:
+        plans = plan_parts(members, limit, descriptor=True)
+    else:
+        plans = [ZipPlan(descriptor=True)]
+        for member in members:
+            plans[0].add(member)
+
+    streams = []
+    for part_num, plan in enumerate(plans, 1):
+        if part_num == 1:
+            zip_path = f"{folderpath}.zip"
+        else:
+            zip_path = f"{folderpath}.part{part_num}.zip"
+        streams.append(ZipStream(plan, zip_path, folderpath))
+    return streams
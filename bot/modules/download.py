@@ -7,6 +7,7 @@ from bot.logger import LOGGER
 import bot.helpers.translations as lang
 
 from ..helpers.utils import cleanup
+from ..helpers.inflight import inflight
 from ..helpers.qobuz.handler import start_qobuz
 from ..helpers.tidal.handler import start_tidal
 from ..helpers.message import send_message, antiSpam, check_user, fetch_user_details
@@ -34,7 +35,7 @@ async def download_track(c, msg:Message):
             user['link'] = link
             user['bot_msg'] = await send_message(msg, 'Downloading.......')
             try:
-                await start_link(link, user)
+                await inflight.run(link, user, start_link)
                 await send_message(user, lang.s.TASK_COMPLETED)
             except Exception as e:
                 LOGGER.error(e)
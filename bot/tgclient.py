@@ -4,6 +4,9 @@ from pyrogram import Client
 
 from .logger import LOGGER
 from .settings import bot_set
+from .helpers.http_pool import http_pool
+from .helpers.rclone import rclone
+from .helpers.scheduler import download_scheduler
 
 plugins = dict(
     root="bot/modules"
@@ -26,12 +29,18 @@ class Bot(Client):
         await bot_set.login_qobuz()
         await bot_set.login_deezer()
         await bot_set.login_tidal()
+        await http_pool.warmup()
+        await rclone.start()
         LOGGER.info("BOT : Started Successfully")
 
     async def stop(self, *args):
         await super().stop()
+        await rclone.stop()
         for client in bot_set.clients:
             await client.session.close()
+        LOGGER.info(f"HTTP POOL : {http_pool.stats()}")
+        LOGGER.info(f"DOWNLOAD SCHEDULER : {download_scheduler.stats()}")
+        await http_pool.close()
         LOGGER.info('BOT : Exited Successfully ! Bye..........')
 
 aio = Bot()
\ No newline at end of file
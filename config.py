@@ -70,7 +70,33 @@ class Config(object):
         'MEMORY_LIMIT': 512 * 1024 * 1024,  # 512MB
         'DB_POOL_SIZE': 5,
         'DB_MAX_OVERFLOW': 10,
-        'WORKER_THREADS': 4
+        'WORKER_THREADS': 4,
+        'TG_UPLOAD_WORKERS': int(getenv("TG_UPLOAD_WORKERS", 4)),  # files uploaded to telegram at once
+        'TG_UPLOAD_SESSIONS': int(getenv("TG_UPLOAD_SESSIONS", 4)),  # connections used for one big document
+        'HTTP_POOL': {
+            'LIMIT': 100,
+            'LIMIT_PER_HOST': 10,
+            'KEEPALIVE_TIMEOUT': 60,  # seconds
+            'DNS_CACHE_TTL': 300,  # seconds
+            'WARMUP_HOSTS': getenv("HTTP_WARMUP_HOSTS", "").split()
+        },
+        'SEGMENTED_DOWNLOAD': {
+            'ENABLED': True,
+            'SEGMENTS': int(getenv("DOWNLOAD_SEGMENTS", 4)),
+            'MIN_SIZE': 20 * 1024 * 1024,  # 20MB, smaller files use a single stream
+            'DASH_WINDOW': 8  # DASH segments fetched ahead of the writer
+        },
+        'DOWNLOAD_SCHEDULER': {
+            'SLOTS': int(getenv("DOWNLOAD_SLOTS", 10)),  # downloads running at once across all jobs
+            'PER_OWNER': int(getenv("MAX_WORKERS", 5)),  # max slots of one user/chat
+            'ADMIN_WEIGHT': 2  # share of an admin compared to a user when slots are contended
+        },
+        'OUTBOUND': {
+            'GLOBAL_RATE': 30,  # messages per second for the whole bot
+            'CHAT_RATE': 1,  # messages per second in a private chat
+            'GROUP_RATE': 20 / 60,  # messages per second in a group
+            'BURST': 3  # messages sent at once in a chat before rate applies
+        }
     }
 
     #--------------------
@@ -80,7 +106,41 @@ class Config(object):
     DOWNLOADS_FOLDER = getenv("DOWNLOADS_FOLDER", "DOWNLOADS")
     DOWNLOAD_BASE_DIR = WORK_DIR + DOWNLOADS_FOLDER
     LOCAL_STORAGE = getenv("LOCAL_STORAGE", DOWNLOAD_BASE_DIR)
+
+    #--------------------
+    # TRACK CACHE
+    #--------------------
+    # keep on the same filesystem as DOWNLOAD_BASE_DIR so files can be hardlinked
+    TRACK_CACHE = {
+        'ENABLED': getenv("TRACK_CACHE", "True").lower() == "true",
+        'PATH': getenv("TRACK_CACHE_DIR", WORK_DIR + "cache/tracks"),
+        'MAX_SIZE': int(getenv("TRACK_CACHE_SIZE", 10240)) * 1024 * 1024  # MB
+    }
+    COVER_CACHE = {
+        'ENABLED': getenv("COVER_CACHE", "True").lower() == "true",
+        'PATH': getenv("COVER_CACHE_DIR", WORK_DIR + "cache/covers"),
+        'MAX_SIZE': int(getenv("COVER_CACHE_SIZE", 512)) * 1024 * 1024,  # MB
+        'THUMB_SIZE': 320  # px, telegram limit for thumbnails
+    }
     
+    #--------------------
+    # RCLONE
+    #--------------------
+    RCLONE_DEST = getenv("RCLONE_DEST", None)  # remote:path
+    INDEX_LINK = getenv("INDEX_LINK", None)
+    RCLONE_RCD = {
+        'ENABLED': getenv("RCLONE_RCD", "True").lower() == "true",
+        'ADDR': getenv("RCLONE_RCD_ADDR", "127.0.0.1:5572"),
+        'CONCURRENCY': int(getenv("RCLONE_RCD_CONCURRENCY", 4)),  # parallel transfers
+        'POLL_INTERVAL': 0.5,  # seconds between job status checks
+        'START_TIMEOUT': 15  # seconds to wait for the daemon to answer
+    }
+
+    #--------------------
+    # TELEGRAM UPLOAD
+    #--------------------
+    TG_MEDIA_GROUP = getenv("TG_MEDIA_GROUP", "False").lower() == "true"  # post album tracks in groups of up to 10
+
     #--------------------
     # FILE/FOLDER NAMING
     #--------------------
@@ -96,7 +156,10 @@ class Config(object):
         'CHUNK_SIZE': 8192,
         'COMPRESSION_LEVEL': 6,
         'ALLOWED_TYPES': ['.mp3', '.flac', '.m4a'],
-        'SPLIT_SIZE': 1900000000  # 1.9GB
+        'SPLIT_SIZE': 1900000000,  # 1.9GB
+        'TELEGRAM_LIMIT': 2000 * 1024 * 1024,  # exact bot upload limit, used for stored (uncompressed) parts
+        'STREAM': getenv("ZIP_STREAM", "True").lower() == "true",  # upload stored zips without writing them to disk
+        'INCREMENTAL': True  # zip tracks while the others are still downloading
     }
 
     #--------------------